@@ -0,0 +1,189 @@
+# Grupo 18:
+# 103902 Luís Pereira
+# 102707 Tomás Correia
+
+"""Solves a batch of PipeMania instances on a pool of worker processes.
+
+Usage: python batch.py <directory | glob> ... [-o OUTPUT_DIR] [-j JOBS] [-t TIMEOUT] [--search STRATEGY]
+
+Every instance (.txt) is solved in its own task; the solution is written to
+OUTPUT_DIR/<name>.out and, when an expected <name>.out sits next to the
+instance, compared against it. An instance may have several solutions, so an
+output that differs from the expected one still counts as solved when it is a
+valid solution made of the instance's tiles."""
+
+import argparse
+import glob
+import io
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from pipe import SEARCH_STRATEGIES, Board, PipeMania, Tile
+
+SOLVED, MISMATCH, UNCHECKED, NO_SOLUTION, TIMEOUT, ERROR = (
+    "solved", "mismatch", "unchecked", "no solution", "timeout", "error")
+FAILURES = (MISMATCH, NO_SOLUTION, TIMEOUT, ERROR)
+
+
+class InstanceTimeout(Exception):
+    """Raised inside a worker when an instance runs past its time limit."""
+
+
+def raise_timeout(signum, frame):
+    raise InstanceTimeout()
+
+
+def collect_instances(patterns):
+    """Expands directories and glob patterns into a sorted list of instance files."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(glob.escape(pattern), "*.txt")
+        paths.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    return sorted(paths)
+
+
+def solve_instance(path: str, timeout: float, search: str = "dfs"):
+    """Solves the instance at path and returns (status, solution bytes or error message, seconds).
+    The time limit is enforced with a real-time interval timer, so a runaway search is
+    interrupted inside the worker instead of holding on to its process."""
+    timed = timeout and hasattr(signal, "setitimer")
+    if timed:
+        signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    start = time.perf_counter()
+    try:
+        board = Board.parse_instance(path)
+        goal_node = SEARCH_STRATEGIES[search](PipeMania(board))
+        if not goal_node:
+            return NO_SOLUTION, None, time.perf_counter() - start
+        solution = io.BytesIO()
+        goal_node.state.layout.write(solution)
+        return SOLVED, solution.getvalue(), time.perf_counter() - start
+    except InstanceTimeout:
+        return TIMEOUT, None, time.perf_counter() - start
+    except Exception as error:
+        return ERROR, f"{type(error).__name__}: {error}", time.perf_counter() - start
+    finally:
+        if timed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def first_difference(solution: bytes, expected: bytes):
+    """Returns the 1-based number of the first line where both outputs differ, ignoring
+    whitespace and trailing blank lines, or 0 if they match."""
+    got = [line.split() for line in solution.splitlines()]
+    want = [line.split() for line in expected.splitlines()]
+    while got and not got[-1]:
+        got.pop()
+    while want and not want[-1]:
+        want.pop()
+    for line, (a, b) in enumerate(zip(got, want), 1):
+        if a != b:
+            return line
+    return 0 if len(got) == len(want) else min(len(got), len(want)) + 1
+
+
+def invalid_solution(path: str, solution: bytes):
+    """Checks an output against the instance at path on its own: the output must keep the tile kind of
+    every cell and connect every tile. Returns the reason it is not a solution, or "" if it is one."""
+    try:
+        instance = Board.read_instance(path)
+        masks = Board.read_masks(solution)
+    except ValueError as error:
+        return f"unreadable output: {error}"
+    if masks.shape != instance.shape:
+        return f"output is {masks.shape[0]}x{masks.shape[1]}, the instance {instance.shape[0]}x{instance.shape[1]}"
+    rotations = np.array(Tile.rotations, dtype=np.uint16)
+    changed = np.argwhere(rotations[masks] != rotations[instance])
+    if changed.size:
+        row, col = changed[0]
+        return f"tile at line {row + 1}, column {col + 1} is not a rotation of the instance's"
+    if not masks.size:
+        return ""
+    board = Board.from_masks(masks)
+    board.refresh_all_connections()
+    problem = PipeMania(board, table_size=0)
+    return "" if problem.verify_solution(problem.initial) else "not every tile is connected"
+
+
+def record_result(path: str, status: str, payload, output_dir: str):
+    """Writes the solution of an instance, checks it against the expected output and
+    returns the final status with a short detail message. An output that differs from the
+    expected one is verified on its own, and is a MISMATCH only if it is not a solution."""
+    if status != SOLVED:
+        return status, payload or ""
+
+    name = os.path.splitext(os.path.basename(path))[0] + ".out"
+    with open(os.path.join(output_dir, name), "wb") as file:
+        file.write(payload)
+
+    expected_path = os.path.splitext(path)[0] + ".out"
+    if not os.path.isfile(expected_path):
+        return UNCHECKED, ""
+    with open(expected_path, "rb") as file:
+        line = first_difference(payload, file.read())
+    if not line:
+        return SOLVED, ""
+    reason = invalid_solution(path, payload)
+    if reason:
+        return MISMATCH, f"differs from {expected_path} at line {line}: {reason}"
+    return SOLVED, f"valid, differs from {expected_path} at line {line}"
+
+
+def run_batch(paths, output_dir: str, jobs=None, timeout: float = 0, search: str = "dfs", out=sys.stdout):
+    """Solves every instance in paths and prints one line per instance followed by a summary.
+    Returns a dict mapping each status to the number of instances that ended with it."""
+    os.makedirs(output_dir, exist_ok=True)
+    counts = dict.fromkeys((SOLVED, UNCHECKED) + FAILURES, 0)
+    solve_time = 0.0
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(solve_instance, path, timeout, search): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                status, payload, seconds = future.result()
+            except Exception as error:
+                status, payload, seconds = ERROR, f"{type(error).__name__}: {error}", 0.0
+            status, detail = record_result(path, status, payload, output_dir)
+            counts[status] += 1
+            solve_time += seconds
+            print(f"{status:<12}{seconds:9.3f}s  {path}" + (f"  ({detail})" if detail else ""), file=out)
+    elapsed = time.perf_counter() - start
+
+    total = len(paths)
+    failed = sum(counts[status] for status in FAILURES)
+    print(f"\n{total} instances in {elapsed:.3f}s "
+          f"({total / elapsed if elapsed else 0.0:.2f} instances/sec, {solve_time:.3f}s solving)", file=out)
+    print(", ".join(f"{count} {status}" for status, count in counts.items() if count) or "nothing to solve", file=out)
+    print(f"{failed} failed" if failed else "all passed", file=out)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a batch of PipeMania instances in parallel.")
+    parser.add_argument("instances", nargs="+", help="directories of .txt instances or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="solutions", help="where the .out files are written")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: all CPUs)")
+    parser.add_argument("-t", "--timeout", type=float, default=60.0,
+                        help="seconds allowed per instance, 0 for no limit (default: 60)")
+    parser.add_argument("--search", choices=SEARCH_STRATEGIES, default="dfs", help="search strategy (default: dfs)")
+    args = parser.parse_args(argv)
+
+    paths = collect_instances(args.instances)
+    if not paths:
+        parser.error("no instances matched")
+    counts = run_batch(paths, args.output_dir, args.jobs, args.timeout, args.search)
+    return 1 if any(counts[status] for status in FAILURES) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+# Grupo 18:
+# 103902 Luís Pereira
+# 102707 Tomás Correia
+
+"""Benchmarks the PipeMania solver on the sample instances and on synthetic boards.
+
+Usage: python benchmark.py [-o results.json] [--compare baseline.json] [--repeat N] [--sizes N ...]
+
+Every case is timed phase by phase (parse, presolve, search, output) over a few
+repeats, and solved once more under tracemalloc to measure its peak memory.
+The results are written as JSON; given a previous results file, the cases that
+got slower, expanded more nodes or used more memory are flagged as regressions."""
+
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from generator import generate_text
+from pipe import SEARCH_STRATEGIES, Board, PipeMania
+from search import InstrumentedProblem
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "test pipe 1-9")
+PHASES = ("parse", "presolve", "search", "output")
+
+
+class CallCounter:
+    """Counts the calls made to a method of a class while the context is active."""
+
+    def __init__(self, owner, name: str):
+        self.owner, self.name = owner, name
+        self.calls = 0
+
+    def __enter__(self):
+        method = self.original = getattr(self.owner, self.name)
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return method(*args, **kwargs)
+
+        setattr(self.owner, self.name, counted)
+        return self
+
+    def __exit__(self, *exc_info):
+        setattr(self.owner, self.name, self.original)
+
+
+def read_bytes(path: str):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def collect_cases(instances_dir: str, sizes, seed: int):
+    """Returns (name, raw bytes, expected output bytes or None) for every benchmark case."""
+    cases = []
+    for path in sorted(glob.glob(os.path.join(glob.escape(instances_dir), "*.txt"))):
+        expected_path = os.path.splitext(path)[0] + ".out"
+        cases.append((os.path.basename(path), read_bytes(path),
+                      read_bytes(expected_path) if os.path.isfile(expected_path) else None))
+    for size in sizes:
+        instance, _ = generate_text(size, size, seed + size)
+        cases.append((f"synthetic-{size}x{size}", instance, None))
+    return cases
+
+
+def run_case(data: bytes, search=SEARCH_STRATEGIES["dfs"]):
+    """Solves one instance, returning the seconds spent in each phase, the search counters and the output."""
+    timings = {}
+    # every lookup in LOCK_TABLE, by verify_locks or by PipeMania.get_locking_action, computes a lock_key
+    with CallCounter(Board, "lock_key") as lock_lookups:
+        start = time.perf_counter()
+        board = Board.from_masks(Board.read_masks(data))
+        timings["parse"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        board.presolve()
+        timings["presolve"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        problem = InstrumentedProblem(PipeMania(board))
+        goal_node = search(problem)
+        timings["search"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        output = io.BytesIO()
+        if goal_node:
+            goal_node.state.layout.write(output)
+        timings["output"] = time.perf_counter() - start
+
+    report = problem.report()
+    counters = {
+        "nodes_expanded": problem.succs,
+        "states_generated": problem.states,
+        "goal_tests": problem.goal_tests,
+        "lock_lookups": lock_lookups.calls,
+        # where the search time went: listing actions, building successors or testing goals
+        "time_actions": report["time_actions"],
+        "time_result": report["time_result"],
+        "time_goal_test": report["time_goal_test"],
+        "max_depth": report["max_depth"],
+        "peak_frontier": report["peak_frontier"],
+    }
+    return timings, counters, output.getvalue() if goal_node else None
+
+
+def benchmark_case(data: bytes, expected, repeat: int, search=SEARCH_STRATEGIES["dfs"]):
+    """Times a case over repeat runs, after one warm-up run, keeping the fastest time of each phase,
+    and measures its peak memory."""
+    best = dict.fromkeys(PHASES, float("inf"))
+    walls = []
+    run_case(data, search)  # warm-up: builds the per-shape tables outside the timed runs
+    for _ in range(repeat):
+        timings, counters, output = run_case(data, search)
+        walls.append(sum(timings.values()))
+        for phase in PHASES:
+            best[phase] = min(best[phase], timings[phase])
+
+    tracemalloc.start()
+    run_case(data, search)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if output is None:
+        status = "unsolved"
+    elif expected is None:
+        status = "solved"
+    else:
+        status = "solved" if output.split() == expected.split() else "mismatch"
+
+    return {
+        "status": status,
+        "wall_time": min(walls),
+        "median_wall_time": sorted(walls)[len(walls) // 2],
+        "phases": best,
+        **counters,
+        "peak_memory_bytes": peak,
+    }
+
+
+def compare_results(current: dict, baseline: dict, threshold: float, min_delta: float = 0.0):
+    """Returns a list of human-readable regressions of current against baseline.
+    Times and memory regress when they grow by more than threshold (a fraction), and times also by
+    more than min_delta seconds, so that sub-millisecond noise is not reported; counters regress on any increase."""
+    regressions = []
+    for name, result in current["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        if before["status"] == "solved" and result["status"] != "solved":
+            regressions.append(f"{name}: {before['status']} -> {result['status']}")
+        for metric in ("wall_time", "peak_memory_bytes"):
+            slack = min_delta if metric == "wall_time" else 0
+            if before[metric] and result[metric] > max(before[metric] * (1 + threshold), before[metric] + slack):
+                regressions.append(f"{name}: {metric} {before[metric]:.6g} -> {result[metric]:.6g} "
+                                   f"(+{result[metric] / before[metric] - 1:.0%})")
+        for metric in ("nodes_expanded", "goal_tests", "lock_lookups"):
+            if metric in before and result[metric] > before[metric]:
+                regressions.append(f"{name}: {metric} {before[metric]} -> {result[metric]}")
+    return regressions
+
+
+def print_table(results: dict, out=sys.stdout):
+    print(f"{'case':<22}{'status':<10}{'wall':>10}" + "".join(f"{phase:>10}" for phase in PHASES)
+          + f"{'nodes':>9}{'goals':>9}{'locks':>9}{'peak KiB':>10}", file=out)
+    for name, result in results["cases"].items():
+        print(f"{name:<22}{result['status']:<10}{result['wall_time']:>10.4f}"
+              + "".join(f"{result['phases'][phase]:>10.4f}" for phase in PHASES)
+              + f"{result['nodes_expanded']:>9}{result['goal_tests']:>9}{result['lock_lookups']:>9}"
+              + f"{result['peak_memory_bytes'] / 1024:>10.1f}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PipeMania solver.")
+    parser.add_argument("--instances", default=SAMPLES_DIR, help="directory of .txt instances (default: the samples)")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10, 20, 25], help="sizes of the synthetic boards")
+    parser.add_argument("--seed", type=int, default=18, help="seed of the synthetic boards")
+    parser.add_argument("--search", choices=SEARCH_STRATEGIES, default="dfs", help="search strategy (default: dfs)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (the fastest is kept)")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown or memory growth flagged as a regression (default: 0.10)")
+    parser.add_argument("--min-delta", type=float, default=0.002,
+                        help="slowdowns of fewer seconds than this are never flagged (default: 0.002)")
+    args = parser.parse_args(argv)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "search": args.search,
+        },
+        "cases": {},
+    }
+    for name, data, expected in collect_cases(args.instances, args.sizes, args.seed):
+        results["cases"][name] = benchmark_case(data, expected, max(1, args.repeat), SEARCH_STRATEGIES[args.search])
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare_results(results, json.load(file), args.threshold, args.min_delta)
+        print(f"\n{len(regressions)} regression(s) against {args.compare}")
+        for regression in regressions:
+            print("  " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# Grupo 18:
+# 103902 Luís Pereira
+# 102707 Tomás Correia
+
+"""Generates solvable PipeMania instances of any size.
+
+Usage: python generator.py ROWS COLS [--seed SEED] [-o instance.txt] [--solution solution.out]
+
+A random spanning tree of the grid, in which no cell has four neighbours, is
+the solution: every cell becomes the F/B/V/L tile with exactly its tree edges
+open. The instance is that solution with every tile turned a random number of
+times. The same seed always yields the same instance.
+
+The instance is solvable but its solution need not be unique: other
+arrangements of the same tiles may connect every cell too. The solution
+written with --solution is one valid answer, not the expected output, so
+check an answer with PipeMania.verify_solution instead of comparing it."""
+
+import argparse
+import sys
+
+import numpy as np
+
+from pipe import Board, UP, RIGHT, DOWN, LEFT
+
+
+def spanning_tree(rows: int, cols: int, rng):
+    """Returns the open-direction masks of a random spanning tree of a rows x cols grid with no cell
+    of degree four. Edges are taken in random order (Kruskal) and skipped when either end is already
+    a three-way tile; in the rare case that this leaves the forest split, the draw is repeated."""
+    if rows * cols < 2:
+        raise ValueError("A board needs at least two tiles")
+
+    cells = np.arange(rows * cols).reshape(rows, cols)
+    first = np.concatenate((cells[:, :-1].ravel(), cells[:-1, :].ravel()))
+    second = np.concatenate((cells[:, 1:].ravel(), cells[1:, :].ravel()))
+    horizontal = (cols - 1) * rows
+
+    while True:
+        order = rng.permutation(first.size)
+        parent = list(range(rows * cols))
+        degree = bytearray(rows * cols)
+        chosen = []
+        for edge, a, b in zip(order.tolist(), first[order].tolist(), second[order].tolist()):
+            if degree[a] == 3 or degree[b] == 3:
+                continue
+            root_a, root_b = a, b
+            while parent[root_a] != root_a:
+                parent[root_a] = parent[parent[root_a]]
+                root_a = parent[root_a]
+            while parent[root_b] != root_b:
+                parent[root_b] = parent[parent[root_b]]
+                root_b = parent[root_b]
+            if root_a != root_b:
+                parent[root_a] = root_b
+                degree[a] += 1
+                degree[b] += 1
+                chosen.append(edge)
+        if len(chosen) == rows * cols - 1:
+            break
+
+    chosen = np.array(chosen)
+    across, down = chosen[chosen < horizontal], chosen[chosen >= horizontal] - horizontal
+    masks = np.zeros(rows * cols, dtype=np.uint8)
+    masks[first[across]] |= RIGHT
+    masks[second[across]] |= LEFT
+    masks[first[horizontal + down]] |= DOWN
+    masks[second[horizontal + down]] |= UP
+    return masks.reshape(rows, cols)
+
+
+def scramble(masks, rng):
+    """Returns a copy of the masks with every tile turned clockwise 0 to 3 times at random."""
+    turns = rng.integers(0, 4, size=masks.shape, dtype=np.uint8)
+    wide = masks.astype(np.uint16) << turns
+    return ((wide | (wide >> 4)) & 0x0F).astype(np.uint8)
+
+
+def generate(rows: int, cols: int, seed=None):
+    """Returns (instance, solution) as arrays of open-direction masks for a rows x cols board.
+    The solution is the tree the instance was made from, one of possibly several."""
+    rng = np.random.default_rng(seed)
+    solution = spanning_tree(rows, cols, rng)
+    return scramble(solution, rng), solution
+
+
+def generate_text(rows: int, cols: int, seed=None):
+    """Returns (instance, solution) as bytes in the format read by Board.parse_instance."""
+    instance, solution = generate(rows, cols, seed)
+    return Board.format_masks(instance), Board.format_masks(solution)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a solvable PipeMania instance.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("cols", type=int)
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random generator")
+    parser.add_argument("-o", "--output", help="write the instance to this file instead of stdout")
+    parser.add_argument("--solution", help="also write the tree the instance was made from to this file; it is one valid "
+                        "solution, and the instance may have others")
+    args = parser.parse_args(argv)
+
+    if args.rows < 1 or args.cols < 1 or args.rows * args.cols < 2:
+        parser.error("the board needs at least two tiles")
+
+    instance, solution = generate_text(args.rows, args.cols, args.seed)
+    if args.output:
+        with open(args.output, "wb") as file:
+            file.write(instance)
+    else:
+        sys.stdout.buffer.write(instance)
+        sys.stdout.buffer.flush()
+    if args.solution:
+        with open(args.solution, "wb") as file:
+            file.write(solution)
+
+
+if __name__ == "__main__":
+    main()
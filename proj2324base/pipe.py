@@ -2,417 +2,1052 @@
 # 103902 Luís Pereira
 # 102707 Tomás Correia
 
+import argparse
+import functools
+import mmap
+import os
+import random
 import sys
-import copy
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
 import numpy as np
 from sys import stdin
+from sat import Solver
+from utils import TranspositionTable
 from search import (
     Problem,
     Node,
+    BudgetedProblem,
+    SearchLimitReached,
     astar_search,
     breadth_first_tree_search,
+    budgeted_search,
     depth_first_tree_search,
     greedy_search,
+    iterative_deepening_astar_search,
+    memory_bounded_astar_search,
+    parallel_depth_first_tree_search,
     recursive_best_first_search,
 )
 
+# Each cell of the board is a single uint8: the low nibble holds the directions
+# the pipe is open to, and the upper bits are the locked/connected bit-planes.
+UP, RIGHT, DOWN, LEFT = 1, 2, 4, 8
+OPEN = UP | RIGHT | DOWN | LEFT
+LOCKED = 0x10
+CONNECTED = 0x20
+
+FC, FD, FB, FE = UP, RIGHT, DOWN, LEFT
+BC, BD, BB, BE = UP | LEFT | RIGHT, UP | DOWN | RIGHT, DOWN | RIGHT | LEFT, UP | DOWN | LEFT
+VC, VD, VB, VE = UP | LEFT, UP | RIGHT, DOWN | RIGHT, DOWN | LEFT
+LH, LV = LEFT | RIGHT, UP | DOWN
+
+# (direction, row offset, column offset) of the four neighbours of a cell
+OFFSETS = ((UP, -1, 0), (RIGHT, 0, 1), (DOWN, 1, 0), (LEFT, 0, -1))
+ALL_ORIENTATIONS = 0xFFFF  # domains are 16-bit sets indexed by open-direction mask
+
+ZOBRIST_SEED = 18
+ZOBRIST_CACHED_SHAPES = 4  # board shapes whose Zobrist tables are kept, 40 bytes per cell each
+LOCK_KEY = 4  # index of a cell's lock key in the Zobrist table, after its four orientations
+TABLE_SIZE = 1 << 16  # entries of PipeMania's transposition table, about 100 bytes each
+VECTORIZED_VALIDATION_CELLS = 2500  # boards at least this big are validated with whole-array operations
+WRITE_CHUNK_BYTES = 1 << 20
+
+# Unlocked cells are ranked by (domain size, fewest locked neighbours): rank 0 is the most constrained
+RANK_COUNT = 4 * 5
+NO_RANK = 0xFF  # rank of locked cells, which are counted in no rank
+
+
+def has(mask, bits):
+    """Returns True if every bit of bits is set in mask."""
+    return mask & bits == bits
+
+
+class Moves:
+    """Persistent list of moved positions: each state only stores its last move and shares the rest with its parent."""
+
+    def __init__(self, position=None, previous=None):
+        self.position = position
+        self.previous = previous
+        self.length = previous.length + 1 if previous is not None else 0
+
+    def __iter__(self):
+        positions = []
+        moves = self
+        while moves.length:
+            positions.append(moves.position)
+            moves = moves.previous
+        return reversed(positions)
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, position):
+        moves = self
+        while moves.length:
+            if moves.position == position:
+                return True
+            moves = moves.previous
+        return False
+
+    def __eq__(self, other):
+        return isinstance(other, Moves) and list(self) == list(other)
+
+
 class PipeManiaState:
     unique_id = 0
 
-    def __init__(self, layout, moves=[]):
+    def __init__(self, layout, moves=None):
         self.layout = layout
         self.id = PipeManiaState.unique_id
-        self.moves = moves
+        self.moves = moves if moves is not None else Moves()
         PipeManiaState.unique_id += 1
 
     def __lt__(self, other):
         return self.id < other.id
 
     def __eq__(self, other):
-        return self.layout == other.layout and self.moves == other.moves
+        # States are the same if their layouts are, regardless of the moves that led to them
+        return isinstance(other, PipeManiaState) and self.layout.key == other.layout.key
 
     def __hash__(self):
-        # TODO: Implement a hash function for the PipeManiaState class (is it needed?)
-        pass
+        return self.layout.key
 
 class Board:
+    # per-cell data, and the per-row counts of every rank, stored as row chunks shared between copies
+    planes = ("rows", "domains", "parents", "sizes", "ends", "ranks", "rank_counts")
 
     def __init__(self):
-        self.cells = np.array([])  # numpy array of Tile objects
+        self.rows = []  # packed uint8 cells, see OPEN/LOCKED/CONNECTED
+        self.domains = []  # uint16 sets of the orientations each cell can still take
+        self.parents = []  # union-find over the connections between locked cells, by flat cell index
+        self.sizes = []
+        self.ends = []  # at each root, the open ends of its network not yet met by a locked neighbour
+        self.ranks = []  # uint8 rank of every cell, NO_RANK once locked
+        self.rank_counts = []  # per row, the uint16 number of its cells with each rank
+        self.rank_totals = []  # number of cells with each rank on the whole board
+        self.owned = {plane: set() for plane in Board.planes}  # rows this board may write in place
+        self.shape = (0, 0)
+        self.connected_count = 0  # cells whose open ends all meet an open neighbour
+        self.locked_count = 0  # cells with the lock bit set
+        self.components = 0  # connected networks, counting every unlocked cell as its own
+        self.acyclic = False  # the pieces have exactly enough openings for a spanning tree, so no cycle can be part of a solution
+        self.pending = []  # cells whose domain shrank and whose neighbours must be revised
+        self.dead = False  # set when propagation empties a domain
         self.recent_tile = None
+        self.zobrist = None
+        self.key = 0  # Zobrist key of the orientations and locks, kept up to date by modify_tile_orientation and mark_locked
+        self.trail = None  # when a list, every cell write is recorded on it so it can be undone
+
+    @staticmethod
+    @functools.lru_cache(maxsize=ZOBRIST_CACHED_SHAPES)
+    def zobrist_table(rows: int, cols: int):
+        """Returns the random 64-bit keys of every (cell, orientation) pair, followed by the key of the
+        cell's lock bit, for boards of the given shape. Only the tables of the last few shapes are kept;
+        the keys depend on the shape alone, so a table made again is the same."""
+        rng = np.random.default_rng(ZOBRIST_SEED)
+        return rng.integers(0, 2**64, size=(rows, cols, 5), dtype=np.uint64)
+
+    def compute_key(self):
+        """Computes the Zobrist key of the whole layout, locks included, from scratch."""
+        self.zobrist = Board.zobrist_table(*self.shape)
+        rows, cols = np.indices(self.shape)
+        cells = self.cells
+        index = np.array(Tile.orientation_index, dtype=np.intp)[cells & OPEN]
+        self.key = int(np.bitwise_xor.reduce(self.zobrist[rows, cols, index], axis=None)
+                       ^ np.bitwise_xor.reduce(self.zobrist[:, :, LOCK_KEY][(cells & LOCKED) != 0]))
+
+    @property
+    def cells(self):
+        """The whole board as a single uint8 array, assembled from the row chunks."""
+        if not self.rows:
+            return np.zeros(self.shape, dtype=np.uint8)
+        return np.vstack(self.rows)
+
+    @cells.setter
+    def cells(self, cells):
+        cells = np.array(cells, dtype=np.uint8, ndmin=2)
+        self.shape = cells.shape
+        self.rows = list(cells)
+        self.owned["rows"] = set(range(self.shape[0]))
+        self.connected_count = int(np.count_nonzero(cells & CONNECTED))
+        self.locked_count = int(np.count_nonzero(cells & LOCKED))
+
+    def writable_row(self, plane: str, row: int):
+        """Returns a row of the given plane, copying it first if it is still shared with another board."""
+        chunks = getattr(self, plane)
+        owned = self.owned[plane]
+        if row not in owned:
+            chunks[row] = chunks[row].copy()
+            owned.add(row)
+        return chunks[row]
+
+    def write_cell(self, plane: str, row: int, col: int, value: int):
+        """Writes one cell of a plane, recording its previous value on the trail if there is one."""
+        chunk = self.writable_row(plane, row)
+        if self.trail is not None:
+            self.trail.append((plane, row, col, chunk.item(col)))
+        chunk[col] = value
+
+    def mark(self):
+        """Returns a point of the trail, with the board's counters, that undo can roll back to."""
+        return (len(self.trail), self.key, self.connected_count, self.locked_count, self.components,
+                self.dead, tuple(self.pending), self.recent_tile, tuple(self.rank_totals))
+
+    def undo(self, mark):
+        """Restores the board to the state it had when mark was taken, popping the trail back to it."""
+        length, self.key, self.connected_count, self.locked_count, self.components, \
+            self.dead, pending, self.recent_tile, rank_totals = mark
+        trail = self.trail
+        while len(trail) > length:
+            plane, row, col, value = trail.pop()
+            self.writable_row(plane, row)[col] = value
+        self.pending = list(pending)
+        self.rank_totals = list(rank_totals)
+
+    def set_tile(self, row: int, col: int, tile: int):
+        self.write_cell("rows", row, col, tile)
+
+    def count_rank(self, row: int, rank: int, change: int):
+        """Adds change to the number of cells of a row, and of the board, with the given rank."""
+        self.write_cell("rank_counts", row, rank, self.rank_counts[row].item(rank) + change)
+        self.rank_totals[rank] += change
+
+    def init_ranks(self):
+        """Ranks every cell and counts the ranks from scratch."""
+        rows, cols = self.shape
+        cells = self.cells
+        domains = np.vstack(self.domains) if self.domains else np.zeros(self.shape, dtype=np.uint16)
+        sizes = sum((domains >> bit) & 1 for bit in range(16))
+        locked = np.pad((cells & LOCKED) != 0, 1).astype(np.uint8)
+        locked_around = locked[:-2, 1:-1] + locked[2:, 1:-1] + locked[1:-1, :-2] + locked[1:-1, 2:]
+        ranks = np.where(cells & LOCKED, NO_RANK, (np.maximum(sizes, 1) - 1) * 5 + 4 - locked_around).astype(np.uint8)
+        self.set_ranks(ranks)
+
+    def set_ranks(self, ranks):
+        """Replaces the ranks of the whole board with an array of them, counting them again."""
+        counts = np.zeros((self.shape[0], RANK_COUNT), dtype=np.uint16)
+        for rank in range(RANK_COUNT):
+            counts[:, rank] = np.count_nonzero(ranks == rank, axis=1)
+        self.ranks = list(ranks.astype(np.uint8))
+        self.rank_counts = list(counts)
+        self.rank_totals = counts.sum(axis=0).tolist()
+        self.owned["ranks"] = self.owned["rank_counts"] = set(range(self.shape[0]))
+
+    def cell_rank(self, row: int, col: int):
+        if self.rows[row].item(col) & LOCKED:
+            return NO_RANK
+        rows, cols = self.shape
+        locked_around = 0
+        for _, d_row, d_col in OFFSETS:
+            r, c = row + d_row, col + d_col
+            if 0 <= r < rows and 0 <= c < cols and self.rows[r].item(c) & LOCKED:
+                locked_around += 1
+        return (max(self.domains[row].item(col).bit_count(), 1) - 1) * 5 + 4 - locked_around
+
+    def update_rank(self, row: int, col: int):
+        """Gives a cell its current rank, if that changed, and moves it between the rank counts."""
+        rank = self.cell_rank(row, col)
+        previous = self.ranks[row].item(col)
+        if rank == previous:
+            return
+        if previous != NO_RANK:
+            self.count_rank(row, previous, -1)
+        if rank != NO_RANK:
+            self.count_rank(row, rank, 1)
+        self.write_cell("ranks", row, col, rank)
+
+    def most_constrained_cell(self, rng=None):
+        """Returns the (row, col) of an unlocked cell with the fewest orientations left and, among those,
+        the most locked neighbours, or None if every cell is locked. Ties go to the first such cell in
+        row-major order, or to a random one if a random.Random is given. The rank totals give the best rank
+        at once; the per-row counts lead to its row, which is the only one scanned cell by cell."""
+        for rank, total in enumerate(self.rank_totals):
+            if total:
+                skip = rng.randrange(total) if rng is not None else 0
+                for row, counts in enumerate(self.rank_counts):
+                    count = counts.item(rank)
+                    if skip < count:
+                        return row, np.flatnonzero(self.ranks[row] == rank).item(skip)
+                    skip -= count
+        return None
+
+    def support(self, row: int, col: int, orientation: int):
+        """Counts the orientations the neighbours of a cell could still take if it were turned to orientation."""
+        rows, cols = self.shape
+        count = 0
+        for direction, d_row, d_col in OFFSETS:
+            r, c = row + d_row, col + d_col
+            if 0 <= r < rows and 0 <= c < cols:
+                facing = Tile.opening[Tile.direction_mapping[direction]]
+                allowed = facing if orientation & direction else ALL_ORIENTATIONS & ~facing
+                count += (self.domains[r].item(c) & allowed).bit_count()
+        return count
 
     def fetch_tile(self, row: int, col: int):
-        return self.cells[row, col]
+        return self.rows[row].item(col)
+
+    def fetch_domain(self, row: int, col: int):
+        return self.domains[row].item(col)
+
+    def set_domain(self, row: int, col: int, domain: int):
+        self.write_cell("domains", row, col, domain)
+        if self.ranks:
+            self.update_rank(row, col)
+
+    def init_domains(self):
+        """Gives every cell the orientations of its kind that are not open to the border or to an adjacent end piece."""
+        rows, cols = self.shape
+        cells = self.cells
+        masks = cells & OPEN
+        domains = np.where(cells & LOCKED, np.left_shift(1, masks, dtype=np.uint16),
+                           np.array(Tile.rotations, dtype=np.uint16)[masks]).astype(np.uint16)
+
+        domains[0, :] &= ~Tile.opening[UP] & ALL_ORIENTATIONS
+        domains[-1, :] &= ~Tile.opening[DOWN] & ALL_ORIENTATIONS
+        domains[:, 0] &= ~Tile.opening[LEFT] & ALL_ORIENTATIONS
+        domains[:, -1] &= ~Tile.opening[RIGHT] & ALL_ORIENTATIONS
+
+        if rows * cols > 2:
+            # Two connected ends would form a closed network of their own
+            ends = np.isin(masks, (UP, RIGHT, DOWN, LEFT))
+            facing = ends[:, :-1] & ends[:, 1:]
+            domains[:, :-1][facing] &= ~Tile.opening[RIGHT] & ALL_ORIENTATIONS
+            domains[:, 1:][facing] &= ~Tile.opening[LEFT] & ALL_ORIENTATIONS
+            facing = ends[:-1, :] & ends[1:, :]
+            domains[:-1, :][facing] &= ~Tile.opening[DOWN] & ALL_ORIENTATIONS
+            domains[1:, :][facing] &= ~Tile.opening[UP] & ALL_ORIENTATIONS
+
+        self.domains = list(domains)
+        self.owned["domains"] = set(range(rows))
+        self.pending = [(row, col) for row in range(rows) for col in range(cols)]
+        self.dead = self.dead or not domains.all()
+
+    def restrict_domain(self, row: int, col: int, allowed: int):
+        """Removes from the cell's domain every orientation not in allowed, queueing the cell if it shrank."""
+        domain = self.domains[row].item(col)
+        if domain & allowed == domain:
+            return True
+        domain &= allowed
+        self.set_domain(row, col, domain)
+        if not domain:
+            self.dead = True
+            return False
+        self.pending.append((row, col))
+        return True
+
+    def propagate(self):
+        """Revises the neighbours of every pending cell until no domain shrinks (AC-3).
+        Cells left with a single orientation are turned to it and locked.
+        Returns False if some domain became empty."""
+        rows, cols = self.shape
+        pending = self.pending
+        while pending and not self.dead:
+            row, col = pending.pop()
+            domain = self.domains[row].item(col)
+
+            if not domain & (domain - 1):
+                orientation = domain.bit_length() - 1
+                tile = self.rows[row].item(col)
+                if not tile & LOCKED or tile & OPEN != orientation:
+                    self.settle_tile(row, col, orientation)
+
+            for direction, d_row, d_col in OFFSETS:
+                r, c = row + d_row, col + d_col
+                if 0 <= r < rows and 0 <= c < cols:
+                    facing = Tile.opening[Tile.direction_mapping[direction]]
+                    allowed = (facing if domain & Tile.opening[direction] else 0) \
+                        | (ALL_ORIENTATIONS & ~facing if domain & ~Tile.opening[direction] else 0)
+                    self.restrict_domain(r, c, allowed)
+
+        if self.dead:
+            self.pending = []
+        return not self.dead
+
+    def settle_tile(self, row: int, col: int, orientation: int):
+        """Turns a cell to the only orientation left in its domain and locks it."""
+        if self.rows[row].item(col) & OPEN != orientation:
+            self.modify_tile_orientation(row, col, orientation)
+        self.mark_locked(row, col)
+        self.refresh_connections(row, col)
+        for _, d_row, d_col in OFFSETS:
+            self.refresh_connections(row + d_row, col + d_col)
+
+    def unified_possible_moves(self, row: int, col: int):
+        """Returns a locking move for every orientation still in the cell's domain."""
+        domain = self.domains[row].item(col)
+        tile = self.rows[row].item(col)
+        return [(row, col, orientation, True) for orientation in Tile.get_locking_orientations(Tile.kind(tile))
+                if domain >> orientation & 1]
 
     def vertical_adjacent_values(self, row: int, col: int):
         """Returns the values immediately above and below the specified cell, respectively."""
-        above = self.cells[row-1, col] if row > 0 else None
-        below = self.cells[row+1, col] if row < self.cells.shape[0] - 1 else None
+        above = self.rows[row-1].item(col) if row > 0 else None
+        below = self.rows[row+1].item(col) if row < self.shape[0] - 1 else None
         return above, below
 
     def horizontal_adjacent_values(self, row: int, col: int):
         """Returns the values immediately to the left and right of the specified cell, respectively."""
-        left = self.cells[row, col-1] if col > 0 else None
-        right = self.cells[row, col+1] if col < self.cells.shape[1] - 1 else None
+        left = self.rows[row].item(col-1) if col > 0 else None
+        right = self.rows[row].item(col+1) if col < self.shape[1] - 1 else None
         return left, right
 
+    def is_locked(self, row: int, col: int):
+        return bool(self.rows[row].item(col) & LOCKED)
+
+    def lock_tile(self, row: int, col: int):
+        tile = self.rows[row].item(col)
+        if tile & LOCKED:
+            return
+        self.mark_locked(row, col)
+        if self.domains:
+            self.restrict_domain(row, col, 1 << (tile & OPEN))
+
+    def mark_locked(self, row: int, col: int):
+        """Sets the lock bit of a cell and joins its network with the locked neighbours it connects to."""
+        tile = self.rows[row].item(col)
+        if not tile & LOCKED:
+            self.locked_count += 1
+            if self.zobrist is not None:
+                self.key ^= self.zobrist.item(row, col, LOCK_KEY)
+        self.set_tile(row, col, tile | LOCKED)
+        if self.parents and not tile & LOCKED:
+            self.join_locked_neighbours(row, col)
+        if self.ranks and not tile & LOCKED:
+            self.update_rank(row, col)
+            rows, cols = self.shape
+            for _, d_row, d_col in OFFSETS:
+                r, c = row + d_row, col + d_col
+                if 0 <= r < rows and 0 <= c < cols:
+                    self.update_rank(r, c)
+
+    def join_locked_neighbours(self, row: int, col: int):
+        """Joins a newly locked cell with the locked neighbours it connects to, and marks the board dead
+        if that closes a network smaller than the board (no open end left to reach the other cells)
+        or, when the pieces can only form a tree, if it closes a cycle."""
+        rows, cols = self.shape
+        cell = row * cols + col
+        tile = self.rows[row].item(col)
+        loose = 0
+        joined = []
+        for direction, d_row, d_col in OFFSETS:
+            if tile & direction:
+                r, c = row + d_row, col + d_col
+                if 0 <= r < rows and 0 <= c < cols and self.rows[r].item(c) & LOCKED \
+                        and Tile.is_connected(tile, self.rows[r].item(c), direction):
+                    joined.append(r * cols + c)
+                else:
+                    loose += 1
+        self.write_cell("ends", row, col, loose)
+
+        for other in joined:
+            root = self.find(other)
+            self.write_cell("ends", root // cols, root % cols, self.ends[root // cols].item(root % cols) - 1)
+            if not self.union(cell, other) and self.acyclic:
+                self.dead = True
+
+        root = self.find(cell)
+        if not self.ends[root // cols].item(root % cols) and self.sizes[root // cols].item(root % cols) < rows * cols:
+            self.dead = True
+
+    def init_components(self):
+        """Builds the union-find of the connections between locked cells, and the open ends of
+        every network, from scratch."""
+        rows, cols = self.shape
+        cells = self.cells
+        masks = cells & OPEN
+        locked = (cells & LOCKED) != 0
+        openings = sum((masks >> bit) & 1 for bit in range(4)).astype(np.int32)
+        self.acyclic = int(openings.sum()) == 2 * (rows * cols - 1)
+
+        across = locked[:, :-1] & locked[:, 1:] & ((masks[:, :-1] & RIGHT) != 0) & ((masks[:, 1:] & LEFT) != 0)
+        below = locked[:-1, :] & locked[1:, :] & ((masks[:-1, :] & DOWN) != 0) & ((masks[1:, :] & UP) != 0)
+        met = np.zeros(self.shape, dtype=np.int32)
+        met[:, :-1] += across
+        met[:, 1:] += across
+        met[:-1, :] += below
+        met[1:, :] += below
+
+        self.parents = list(np.arange(rows * cols, dtype=np.int32).reshape(rows, cols))
+        self.sizes = list(np.ones((rows, cols), dtype=np.int32))
+        self.ends = list(np.where(locked, openings - met, 0).astype(np.int32))
+        for plane in ("parents", "sizes", "ends"):
+            self.owned[plane] = set(range(rows))
+        self.components = rows * cols
+
+        index = np.arange(rows * cols).reshape(rows, cols)
+        for a, b in zip(np.concatenate((index[:, :-1][across], index[:-1, :][below])).tolist(),
+                        np.concatenate((index[:, 1:][across], index[1:, :][below])).tolist()):
+            if not self.union(a, b) and self.acyclic:
+                self.dead = True
+        for cell in np.flatnonzero(locked).tolist():
+            root = self.find(cell)
+            if not self.ends[root // cols].item(root % cols) and self.sizes[root // cols].item(root % cols) < rows * cols:
+                self.dead = True
+
+    def find(self, index: int):
+        """Returns the root of the network of a flat cell index. Union by size keeps the trees shallow,
+        so there is no path compression (it would copy shared rows on every lookup)."""
+        cols = self.shape[1]
+        parent = self.parents[index // cols].item(index % cols)
+        while parent != index:
+            index = parent
+            parent = self.parents[index // cols].item(index % cols)
+        return index
+
+    def union(self, a: int, b: int):
+        """Merges the networks of two flat cell indexes; returns False if they already were the same."""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        cols = self.shape[1]
+        size_a = self.sizes[root_a // cols].item(root_a % cols)
+        size_b = self.sizes[root_b // cols].item(root_b % cols)
+        if size_a < size_b:
+            root_a, root_b = root_b, root_a
+        self.write_cell("parents", root_b // cols, root_b % cols, root_a)
+        self.write_cell("sizes", root_a // cols, root_a % cols, size_a + size_b)
+        if self.ends:
+            self.write_cell("ends", root_a // cols, root_a % cols,
+                            self.ends[root_a // cols].item(root_a % cols) + self.ends[root_b // cols].item(root_b % cols))
+        self.components -= 1
+        return True
+
     def refresh_connections(self, row: int, col: int):
 
-        if not (0 <= row < self.cells.shape[0]) or not (0 <= col < self.cells.shape[1]):
+        if not (0 <= row < self.shape[0]) or not (0 <= col < self.shape[1]):
             return
 
         left_tile, right_tile = self.horizontal_adjacent_values(row, col)
         top_tile, bottom_tile = self.vertical_adjacent_values(row, col)
 
-        tile = self.cells[row, col]
-        connections = sum([
-            1 if left_tile and tile.is_connected(left_tile, "left") else 0,
-            1 if right_tile and tile.is_connected(right_tile, "right") else 0,
-            1 if top_tile and tile.is_connected(top_tile, "up") else 0,
-            1 if bottom_tile and tile.is_connected(bottom_tile, "down") else 0,
-        ])
+        tile = self.rows[row].item(col)
+        joined = 0
+        for direction, adjacent in ((LEFT, left_tile), (RIGHT, right_tile), (UP, top_tile), (DOWN, bottom_tile)):
+            if adjacent is not None and Tile.is_connected(tile, adjacent, direction):
+                joined |= direction
 
-        tile.connections = connections
+        connected = CONNECTED if joined == tile & OPEN else 0
+        if tile & CONNECTED != connected:
+            self.connected_count += 1 if connected else -1
+            self.set_tile(row, col, tile ^ CONNECTED)
 
     @staticmethod
-    def parse_instance():
-        """Reads the problem instance from standard input (stdin) and returns a Board instance."""
-        input_lines = sys.stdin.read().strip().split('\n')
+    def parse_instance(path=None):
+        """Reads the problem instance from standard input (stdin), or from the file at path,
+        and returns a Board instance."""
+        board = Board.from_masks(Board.read_instance(path))
+        board.presolve()
+        return board
 
-        board = Board()
-        cells = []
+    @staticmethod
+    def read_instance(path=None):
+        """Reads the raw instance from stdin, or memory-maps the file at path, and returns its open-direction masks."""
+        if path is not None:
+            with open(path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return Board.read_masks(b'')
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return Board.read_masks(data)
+        if hasattr(sys.stdin, 'buffer'):
+            return Board.read_masks(sys.stdin.buffer.read())
+        return Board.read_masks(sys.stdin.read().encode())
 
-        for line in input_lines:
-            row_tiles = [Tile(tile_str) for tile_str in line.split()]
-            cells.append(row_tiles)
+    @staticmethod
+    def from_masks(masks):
+        """Builds a board, with its hash, components and full domains, from an array of open-direction masks."""
+        if not masks.size:
+            raise ValueError("The instance has no tiles")
+        board = Board()
+        board.cells = masks
+        board.compute_key()
+        board.init_components()
+        board.init_domains()
+        board.init_ranks()
+        return board
 
-        board.cells = np.array(cells)
+    def presolve(self):
+        """Locks every tile whose orientation is forced by the rules or by propagation,
+        before any search, and refreshes the connected bit-plane."""
+        self.propagate()
 
-        for row_idx in range(board.cells.shape[0]):
-            for col_idx in range(board.cells.shape[1]):
-                tile = board.cells[row_idx, col_idx]
-                if board.verify_locks(row_idx, col_idx, tile.orientation):
-                    tile.locked = True
+        for row_idx in range(self.shape[0]):
+            for col_idx in range(self.shape[1]):
+                tile = self.rows[row_idx].item(col_idx)
+                if self.verify_locks(row_idx, col_idx, tile & OPEN):
+                    self.lock_tile(row_idx, col_idx)
+        self.propagate()
 
-        for row_idx in range(board.cells.shape[0]):
-            for col_idx in range(board.cells.shape[1]):
-                board.refresh_connections(row_idx, col_idx)
+        self.refresh_all_connections()
 
-        return board
+    @staticmethod
+    def read_masks(data):
+        """Maps the two-letter codes of an instance, given as bytes, to a uint8 array of open-direction masks."""
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        printable = np.flatnonzero(buffer > ord(' '))
+        letters = buffer[printable]
+        newlines = np.cumsum(buffer == ord('\n'))
+        # Only copies are kept from here on, so a memory-mapped source can be closed even if validation fails.
+        del buffer
+        if not printable.size:
+            return np.zeros((0, 0), dtype=np.uint8)
+        firsts, seconds = printable[0::2], printable[1::2]
+        # each code is a token of its own: two adjacent letters, with whitespace (or the end) after them
+        if printable.size % 2 or (seconds != firsts + 1).any() or (firsts[1:] == seconds[:-1] + 1).any():
+            raise ValueError("Every tile must be a two-letter code")
+
+        masks = Tile.code_masks[(letters[0::2].astype(np.uint16) << 8) | letters[1::2]]
+        if not masks.all():
+            raise ValueError("Unknown tile code in the instance")
+
+        lines = newlines[firsts]
+        _, row_lengths = np.unique(lines, return_counts=True)
+        if (row_lengths != row_lengths[0]).any():
+            raise ValueError("Every row must have the same number of tiles")
+        return masks.reshape(row_lengths.size, row_lengths[0])
+
+    def refresh_all_connections(self):
+        """Recomputes the connected bit-plane of the whole board at once."""
+        connected = self.connected_tiles()
+        self.cells = np.where(connected, self.cells | CONNECTED, self.cells & (0xFF ^ CONNECTED)).astype(np.uint8)
+
+    def write(self, out=None, chunk_size=WRITE_CHUNK_BYTES):
+        """Writes the board in the output format to a binary stream (stdout by default), a block of rows at a time."""
+        out = out if out is not None else sys.stdout.buffer
+        rows, cols = self.shape
+        if cols:
+            step = max(1, chunk_size // (3 * cols))
+            for start in range(0, rows, step):
+                out.write(self.format_rows(start, start + step))
+        out.flush()
+
+    def format_rows(self, start: int, stop: int):
+        """Returns the output lines of rows start to stop as bytes: codes separated by tabs, each line ending in a newline."""
+        return Board.format_masks(np.vstack(self.rows[start:stop]) & OPEN)
 
-    def modify_tile_orientation(self, row: int, col: int, orientation: str):
-        modified_tile = self.fetch_tile(row, col)
-        modified_tile.orientation = orientation
+    @staticmethod
+    def format_masks(masks):
+        """Returns a 2D array of open-direction masks in the instance format, as bytes."""
+        text = np.empty(masks.shape + (3,), dtype=np.uint8)
+        text[..., :2] = Tile.code_bytes[masks]
+        text[..., 2] = ord('\t')
+        text[:, -1, 2] = ord('\n')
+        return text.tobytes()
+
+    def connected_tiles(self):
+        """Returns a boolean array of the tiles whose open ends all meet an open neighbour,
+        comparing the mask array with shifted copies of itself instead of visiting each tile."""
+        masks = self.cells & OPEN
+        up, right, down, left = (masks & UP) != 0, (masks & RIGHT) != 0, (masks & DOWN) != 0, (masks & LEFT) != 0
+
+        dangling = np.zeros(self.shape, dtype=bool)
+        dangling[0, :] |= up[0, :]
+        dangling[-1, :] |= down[-1, :]
+        dangling[:, 0] |= left[:, 0]
+        dangling[:, -1] |= right[:, -1]
+        dangling[:, :-1] |= right[:, :-1] & ~left[:, 1:]
+        dangling[:, 1:] |= left[:, 1:] & ~right[:, :-1]
+        dangling[:-1, :] |= down[:-1, :] & ~up[1:, :]
+        dangling[1:, :] |= up[1:, :] & ~down[:-1, :]
+        return ~dangling
+
+    def unlocked_regions(self):
+        """Groups the unlocked cells into regions of cells joined through unlocked neighbours, each a list of
+        (row, col) in row-major order. Cells of different regions only touch locked cells, so no move in one
+        region can change the domains of another."""
+        rows, cols = self.shape
+        unlocked = set(np.flatnonzero((self.cells & LOCKED) == 0).tolist())
+        regions = []
+        while unlocked:
+            start = min(unlocked)
+            unlocked.discard(start)
+            region, stack = [start], [start]
+            while stack:
+                row, col = divmod(stack.pop(), cols)
+                for _, d_row, d_col in OFFSETS:
+                    r, c = row + d_row, col + d_col
+                    if 0 <= r < rows and 0 <= c < cols and r * cols + c in unlocked:
+                        unlocked.discard(r * cols + c)
+                        region.append(r * cols + c)
+                        stack.append(r * cols + c)
+            regions.append([divmod(cell, cols) for cell in sorted(region)])
+        return regions
+
+    def component_labels(self):
+        """Labels every tile with the smallest flat index of the network it belongs to.
+        Labels are propagated across all joined edges at once: each round hooks the larger label of
+        every edge whose ends disagree onto the smaller one, then pointer-jumps until every tile
+        points at its root, so the number of rounds grows with log(size) rather than path length."""
+        masks = self.cells & OPEN
+        index = np.arange(masks.size, dtype=np.int64).reshape(self.shape)
+        horizontal = ((masks[:, :-1] & RIGHT) != 0) & ((masks[:, 1:] & LEFT) != 0)
+        vertical = ((masks[:-1, :] & DOWN) != 0) & ((masks[1:, :] & UP) != 0)
+        first = np.concatenate((index[:, :-1][horizontal], index[:-1, :][vertical]))
+        second = np.concatenate((index[:, 1:][horizontal], index[1:, :][vertical]))
+
+        labels = index.ravel().copy()
+        while True:
+            first_labels, second_labels = labels[first], labels[second]
+            differ = first_labels != second_labels
+            if not differ.any():
+                return labels.reshape(self.shape)
+            first_labels, second_labels = first_labels[differ], second_labels[differ]
+            np.minimum.at(labels, np.maximum(first_labels, second_labels), np.minimum(first_labels, second_labels))
+            while True:
+                jumped = labels[labels]
+                if np.array_equal(jumped, labels):
+                    break
+                labels = jumped
+
+    def modify_tile_orientation(self, row: int, col: int, orientation: int):
+        tile = self.rows[row].item(col)
+        self.key ^= self.zobrist.item(row, col, Tile.orientation_index[tile & OPEN]) \
+            ^ self.zobrist.item(row, col, Tile.orientation_index[orientation])
+        self.set_tile(row, col, (tile & ~OPEN) | orientation)
         self.recent_tile = (row, col)
 
-    def compare_boards(self, other):
-        """Compares the board with another board passed as an argument."""
-        def tiles_are_equal(tile1, tile2):
-            return tile1 == tile2 and tile1.locked == tile2.locked
-
-        return np.array_equal(self.cells, other.cells, tiles_are_equal)
-
     def copy(self):
+        """Returns a copy that shares every row with this board until one of them writes to it."""
         duplicate_board = Board()
-        duplicate_board.cells = np.copy(self.cells)
+        for plane in Board.planes:
+            setattr(duplicate_board, plane, list(getattr(self, plane)))
+        self.owned = {plane: set() for plane in Board.planes}
+        duplicate_board.shape = self.shape
+        duplicate_board.connected_count = self.connected_count
+        duplicate_board.locked_count = self.locked_count
+        duplicate_board.components = self.components
+        duplicate_board.acyclic = self.acyclic
+        duplicate_board.pending = list(self.pending)
+        duplicate_board.dead = self.dead
+        duplicate_board.rank_totals = list(self.rank_totals)
+        duplicate_board.zobrist = self.zobrist
+        duplicate_board.key = self.key
         return duplicate_board
 
+    def __getstate__(self):
+        # the Zobrist table is shared by every board of a shape, so it is rebuilt from the seed instead of pickled
+        state = self.__dict__.copy()
+        state["zobrist"] = None
+        state["trail"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # boards pickled together keep sharing their rows, so none of them may write to one in place
+        self.owned = {plane: set() for plane in Board.planes}
+        if self.rows:
+            self.zobrist = Board.zobrist_table(*self.shape)
+
     def row_count(self):
         """Return the number of rows in the board."""
-        return self.cells.shape[0]
+        return self.shape[0]
 
     def column_count(self, row):
         """Return the number of columns in a specific row."""
-        return self.cells.shape[1]
+        return self.shape[1]
 
     def __str__(self) -> str:
-        return '\n'.join(
-            '\t'.join(tile.orientation for tile in row)
-            for row in self.cells
-        )
-
-    def verify_locks(self, row: int, col: int, orientation: str):
-        left_tile, right_tile = self.horizontal_adjacent_values(row, col)
-        top_tile, bottom_tile = self.vertical_adjacent_values(row, col)
-
-        tile = Tile(orientation)
-        zones = self.get_zones(row, col)
-        conditions = self.get_conditions(tile, left_tile, right_tile, top_tile, bottom_tile)
-
-        if self.is_corner_or_edge(zones, orientation, conditions):
-            return True
-
-        return self.is_center(orientation, conditions, left_tile, right_tile, top_tile, bottom_tile)
+        if not self.rows or not self.shape[1]:
+            return ''
+        return self.format_rows(0, self.shape[0])[:-1].decode()
+
+    def verify_locks(self, row: int, col: int, orientation: int):
+        return bool(LOCK_TABLE[self.lock_key(row, col)] >> orientation & 1)
+
+    def lock_key(self, row: int, col: int):
+        """Packs the cell's border sides and the lock/connect/end masks of its neighbours into an index of LOCK_TABLE."""
+        rows, cols = self.shape
+        key = self.get_zones(row, col) << 12
+        for direction, d_row, d_col in OFFSETS:
+            r, c = row + d_row, col + d_col
+            if 0 <= r < rows and 0 <= c < cols:
+                key |= NEIGHBOUR_KEYS[direction][self.rows[r].item(c) & (OPEN | LOCKED)]
+        return key
 
     def get_zones(self, row, col):
-        max_row, max_col = self.cells.shape[0] - 1, self.cells.shape[1] - 1
-        return {
-            "leftUpperCorner": (row, col) == (0, 0),
-            "rightUpperCorner": (row, col) == (0, max_col),
-            "leftLowerCorner": (row, col) == (max_row, 0),
-            "rightLowerCorner": (row, col) == (max_row, max_col),
-            "upperEdge": row == 0 and 0 < col < max_col,
-            "lowerEdge": row == max_row and 0 < col < max_col,
-            "leftEdge": col == 0 and 0 < row < max_row,
-            "rightEdge": col == max_col and 0 < row < max_row,
-        }
+        """Returns the board sides the cell lies on, as a direction mask (0 for the center)."""
+        max_row, max_col = self.shape[0] - 1, self.shape[1] - 1
+        zones = (UP if row == 0 else 0) | (DOWN if row == max_row else 0) \
+            | (LEFT if col == 0 else 0) | (RIGHT if col == max_col else 0)
+        # Single row/column boards: the upper and left sides take precedence.
+        if zones & UP:
+            zones &= ~DOWN
+        if zones & LEFT:
+            zones &= ~RIGHT
+        return zones
 
-    def get_conditions(self, tile, left_tile, right_tile, top_tile, bottom_tile):
-        return {
-            "upConnects": top_tile and top_tile.locked and tile.connects_with(top_tile, "up"),
-            "downConnects": bottom_tile and bottom_tile.locked and tile.connects_with(bottom_tile, "down"),
-            "leftConnects": left_tile and left_tile.locked and tile.connects_with(left_tile, "left"),
-            "rightConnects": right_tile and right_tile.locked and tile.connects_with(right_tile, "right"),
-            "upDoesntConnect": top_tile and top_tile.locked and not tile.connects_with(top_tile, "up"),
-            "downDoesntConnect": bottom_tile and bottom_tile.locked and not tile.connects_with(bottom_tile, "down"),
-            "leftDoesntConnect": left_tile and left_tile.locked and not tile.connects_with(left_tile, "left"),
-            "rightDoesntConnect": right_tile and right_tile.locked and not tile.connects_with(right_tile, "right"),
+    @staticmethod
+    def compile_lock_table():
+        """Evaluates the lock rules below for every border class and neighbour mask.
+        The result maps a lock key (see lock_key) to the set of orientations that lock."""
+        orientations = list(Tile.open_directions.values())
+        zone_classes = (UP | LEFT, UP | RIGHT, DOWN | LEFT, DOWN | RIGHT, UP, DOWN, LEFT, RIGHT)
+        # A locked neighbour either connects or doesn't, so the two masks never overlap
+        conditions = [(connects, blocks) for connects in range(16) for blocks in range(16) if not connects & blocks]
+
+        center_locks = {
+            (connects, blocks, ends): sum(1 << o for o in orientations if Board.is_center(o, connects, blocks, ends))
+            for connects, blocks in conditions for ends in range(16)
         }
 
-    def is_corner_or_edge(self, zones, orientation, conditions):
+        table = [0] * (1 << 16)
+        for zones in (0,) + zone_classes:
+            for connects, blocks in conditions:
+                edge_locks = sum(1 << o for o in orientations
+                                 if zones and Board.is_corner_or_edge(zones, o, connects, blocks))
+                for ends in range(16):
+                    table[zones << 12 | connects << 8 | blocks << 4 | ends] = \
+                        edge_locks | center_locks[connects, blocks, ends]
+        return table
+
+    @staticmethod
+    def compile_neighbour_keys():
+        """Returns, for each direction, the lock key bits set by a neighbour on that side given its open/locked bits."""
+        neighbour_keys = {}
+        for direction in (UP, RIGHT, DOWN, LEFT):
+            keys = [0] * (OPEN | LOCKED + 1)
+            for tile in range(len(keys)):
+                if tile & LOCKED:
+                    keys[tile] |= direction << 8 if Tile.connects_with(tile, direction) else direction << 4
+                if bin(tile & OPEN).count("1") == 1:
+                    keys[tile] |= direction
+            neighbour_keys[direction] = keys
+        return neighbour_keys
+
+    @staticmethod
+    def is_corner_or_edge(zones, orientation, connects, blocks):
         corner_edge_locks = {
-            "leftUpperCorner": self.lock_left_upper_corner,
-            "rightUpperCorner": self.lock_right_upper_corner,
-            "leftLowerCorner": self.lock_left_lower_corner,
-            "rightLowerCorner": self.lock_right_lower_corner,
-            "upperEdge": self.lock_upper_edge,
-            "lowerEdge": self.lock_lower_edge,
-            "leftEdge": self.lock_left_edge,
-            "rightEdge": self.lock_right_edge,
+            UP | LEFT: Board.lock_left_upper_corner,
+            UP | RIGHT: Board.lock_right_upper_corner,
+            DOWN | LEFT: Board.lock_left_lower_corner,
+            DOWN | RIGHT: Board.lock_right_lower_corner,
+            UP: Board.lock_upper_edge,
+            DOWN: Board.lock_lower_edge,
+            LEFT: Board.lock_left_edge,
+            RIGHT: Board.lock_right_edge,
         }
-        for zone, lock_func in corner_edge_locks.items():
-            if zones[zone]:
-                return lock_func(orientation, conditions)
-        return False
+        return corner_edge_locks[zones](orientation, connects, blocks)
 
-    def lock_left_upper_corner(self, orientation, conditions):
+    @staticmethod
+    def lock_left_upper_corner(orientation, connects, blocks):
         return {
-            "VB": True,
-            "FD": conditions["downDoesntConnect"] or conditions["rightConnects"],
-            "FB": conditions["downConnects"] or conditions["rightDoesntConnect"],
+            VB: True,
+            FD: bool(blocks & DOWN or connects & RIGHT),
+            FB: bool(connects & DOWN or blocks & RIGHT),
         }.get(orientation, False)
 
-    def lock_right_upper_corner(self, orientation, conditions):
+    @staticmethod
+    def lock_right_upper_corner(orientation, connects, blocks):
         return {
-            "VE": True,
-            "FE": conditions["downDoesntConnect"] or conditions["leftConnects"],
-            "FB": conditions["downConnects"] or conditions["leftDoesntConnect"],
+            VE: True,
+            FE: bool(blocks & DOWN or connects & LEFT),
+            FB: bool(connects & DOWN or blocks & LEFT),
         }.get(orientation, False)
 
-    def lock_left_lower_corner(self, orientation, conditions):
+    @staticmethod
+    def lock_left_lower_corner(orientation, connects, blocks):
         return {
-            "VD": True,
-            "FD": conditions["upDoesntConnect"] or conditions["rightConnects"],
-            "FC": conditions["upConnects"] or conditions["rightDoesntConnect"],
+            VD: True,
+            FD: bool(blocks & UP or connects & RIGHT),
+            FC: bool(connects & UP or blocks & RIGHT),
         }.get(orientation, False)
 
-    def lock_right_lower_corner(self, orientation, conditions):
+    @staticmethod
+    def lock_right_lower_corner(orientation, connects, blocks):
         return {
-            "VC": True,
-            "FE": conditions["upDoesntConnect"] or conditions["leftConnects"],
-            "FC": conditions["upConnects"] or conditions["leftDoesntConnect"],
+            VC: True,
+            FE: bool(blocks & UP or connects & LEFT),
+            FC: bool(connects & UP or blocks & LEFT),
         }.get(orientation, False)
 
-    def lock_upper_edge(self, orientation, conditions):
+    @staticmethod
+    def lock_upper_edge(orientation, connects, blocks):
         return {
-            "FB": conditions["downConnects"] or (conditions["leftDoesntConnect"] and conditions["rightDoesntConnect"]),
-            "FD": conditions["rightConnects"] or (conditions["downDoesntConnect"] and conditions["leftDoesntConnect"]),
-            "FE": conditions["leftConnects"] or (conditions["downDoesntConnect"] and conditions["rightDoesntConnect"]),
-            "BB": True,
-            "LH": True,
-            "VE": conditions["leftConnects"] or conditions["rightDoesntConnect"],
-            "VB": conditions["rightConnects"] or conditions["leftDoesntConnect"],
+            FB: bool(connects & DOWN or has(blocks, LEFT | RIGHT)),
+            FD: bool(connects & RIGHT or has(blocks, DOWN | LEFT)),
+            FE: bool(connects & LEFT or has(blocks, DOWN | RIGHT)),
+            BB: True,
+            LH: True,
+            VE: bool(connects & LEFT or blocks & RIGHT),
+            VB: bool(connects & RIGHT or blocks & LEFT),
         }.get(orientation, False)
 
-    def lock_lower_edge(self, orientation, conditions):
+    @staticmethod
+    def lock_lower_edge(orientation, connects, blocks):
         return {
-            "FC": conditions["upConnects"] or (conditions["leftDoesntConnect"] and conditions["rightDoesntConnect"]),
-            "FD": conditions["rightConnects"] or (conditions["upDoesntConnect"] and conditions["leftDoesntConnect"]),
-            "FE": conditions["leftConnects"] or (conditions["upDoesntConnect"] and conditions["rightDoesntConnect"]),
-            "BC": True,
-            "LH": True,
-            "VC": conditions["leftConnects"] or conditions["rightDoesntConnect"],
-            "VD": conditions["rightConnects"] or conditions["leftDoesntConnect"],
+            FC: bool(connects & UP or has(blocks, LEFT | RIGHT)),
+            FD: bool(connects & RIGHT or has(blocks, UP | LEFT)),
+            FE: bool(connects & LEFT or has(blocks, UP | RIGHT)),
+            BC: True,
+            LH: True,
+            VC: bool(connects & LEFT or blocks & RIGHT),
+            VD: bool(connects & RIGHT or blocks & LEFT),
         }.get(orientation, False)
 
-    def lock_left_edge(self, orientation, conditions):
+    @staticmethod
+    def lock_left_edge(orientation, connects, blocks):
         return {
-            "FD": conditions["rightConnects"] or (conditions["upDoesntConnect"] and conditions["downDoesntConnect"]),
-            "FB": conditions["downConnects"] or (conditions["upDoesntConnect"] and conditions["rightDoesntConnect"]),
-            "FC": conditions["upConnects"] or (conditions["downDoesntConnect"] and conditions["rightDoesntConnect"]),
-            "BD": True,
-            "LV": True,
-            "VB": conditions["downConnects"] or conditions["upDoesntConnect"],
-            "VD": conditions["upConnects"] or conditions["downDoesntConnect"],
+            FD: bool(connects & RIGHT or has(blocks, UP | DOWN)),
+            FB: bool(connects & DOWN or has(blocks, UP | RIGHT)),
+            FC: bool(connects & UP or has(blocks, DOWN | RIGHT)),
+            BD: True,
+            LV: True,
+            VB: bool(connects & DOWN or blocks & UP),
+            VD: bool(connects & UP or blocks & DOWN),
         }.get(orientation, False)
 
-    def lock_right_edge(self, orientation, conditions):
+    @staticmethod
+    def lock_right_edge(orientation, connects, blocks):
         return {
-            "FE": conditions["leftConnects"] or (conditions["upDoesntConnect"] and conditions["downDoesntConnect"]),
-            "FB": conditions["downConnects"] or (conditions["upDoesntConnect"] and conditions["leftDoesntConnect"]),
-            "FC": conditions["upConnects"] or (conditions["downDoesntConnect"] and conditions["leftDoesntConnect"]),
-            "BE": True,
-            "LV": True,
-            "VC": conditions["upConnects"] or conditions["downDoesntConnect"],
-            "VE": conditions["downConnects"] or conditions["upDoesntConnect"],
+            FE: bool(connects & LEFT or has(blocks, UP | DOWN)),
+            FB: bool(connects & DOWN or has(blocks, UP | LEFT)),
+            FC: bool(connects & UP or has(blocks, DOWN | LEFT)),
+            BE: True,
+            LV: True,
+            VC: bool(connects & UP or blocks & DOWN),
+            VE: bool(connects & DOWN or blocks & UP),
         }.get(orientation, False)
 
-    def is_center(self, orientation, conditions, left_tile, right_tile, top_tile, bottom_tile):
-        def check_connections(connect, doesnt_connects, tiles):
-            return connect or all(doesnt_connect or (tile and tile.orientation[0] == "F") for doesnt_connect, tile in zip(doesnt_connects, tiles))
-
-        center_conditions = {
-            "FB": lambda: check_connections(
-                conditions["downConnects"],
-                [conditions["upDoesntConnect"], conditions["leftDoesntConnect"], conditions["rightDoesntConnect"]],
-                [top_tile, left_tile, right_tile]
-            ),
-            "FD": lambda: check_connections(
-                conditions["rightConnects"],
-                [conditions["downDoesntConnect"], conditions["upDoesntConnect"], conditions["leftDoesntConnect"]],
-                [bottom_tile, top_tile, left_tile]
-            ),
-            "FE": lambda: check_connections(
-                conditions["leftConnects"],
-                [conditions["downDoesntConnect"], conditions["upDoesntConnect"], conditions["rightDoesntConnect"]],
-                [bottom_tile, top_tile, right_tile]
-            ),
-            "FC": lambda: check_connections(
-                conditions["upConnects"],
-                [conditions["downDoesntConnect"], conditions["leftDoesntConnect"], conditions["rightDoesntConnect"]],
-                [bottom_tile, left_tile, right_tile]
-            ),
-            "LH": lambda: (conditions["leftConnects"] or conditions["rightConnects"]) or (conditions["upDoesntConnect"] or conditions["downDoesntConnect"]),
-            "LV": lambda: (conditions["upConnects"] or conditions["downConnects"]) or (conditions["leftDoesntConnect"] or conditions["rightDoesntConnect"]),
-            "BB": lambda: conditions["upDoesntConnect"] or (conditions["leftConnects"] and conditions["rightConnects"] and conditions["downConnects"]),
-            "BC": lambda: conditions["downDoesntConnect"] or (conditions["leftConnects"] and conditions["rightConnects"] and conditions["upConnects"]),
-            "BE": lambda: conditions["rightDoesntConnect"] or (conditions["leftConnects"] and conditions["upConnects"] and conditions["downConnects"]),
-            "BD": lambda: conditions["leftDoesntConnect"] or (conditions["rightConnects"] and conditions["upConnects"] and conditions["downConnects"]),
-            "VC": lambda: (
-                    (conditions["upConnects"] and conditions["leftConnects"]) or
-                    (conditions["leftConnects"] and conditions["downDoesntConnect"]) or
-                    (conditions["upConnects"] and conditions["rightDoesntConnect"]) or
-                    (conditions["downDoesntConnect"] and conditions["rightDoesntConnect"]) or
-                    ((conditions["upConnects"] and top_tile and top_tile.orientation[0] == "F") and (right_tile and right_tile.orientation[0] == "F")) or
-                    ((conditions["leftConnects"] and left_tile and left_tile.orientation[0] == "F") and (bottom_tile and bottom_tile.orientation[0] == "F"))
-            ),
-            "VD": lambda: (
-                    (conditions["upConnects"] and conditions["rightConnects"]) or
-                    (conditions["rightConnects"] and conditions["downDoesntConnect"]) or
-                    (conditions["upConnects"] and conditions["leftDoesntConnect"]) or
-                    (conditions["downDoesntConnect"] and conditions["leftDoesntConnect"]) or
-                    ((conditions["upConnects"] and top_tile and top_tile.orientation[0] == "F") and (left_tile and left_tile.orientation[0] == "F")) or
-                    ((conditions["rightConnects"] and right_tile and right_tile.orientation[0] == "F") and (bottom_tile and bottom_tile.orientation[0] == "F"))
-            ),
-            "VE": lambda: (
-                    (conditions["downConnects"] and conditions["leftConnects"]) or
-                    (conditions["leftConnects"] and conditions["upDoesntConnect"]) or
-                    (conditions["downConnects"] and conditions["rightDoesntConnect"]) or
-                    (conditions["upDoesntConnect"] and conditions["rightDoesntConnect"]) or
-                    ((conditions["downConnects"] and bottom_tile and bottom_tile.orientation[0] == "F") and (right_tile and right_tile.orientation[0] == "F")) or
-                    ((conditions["leftConnects"] and left_tile and left_tile.orientation[0] == "F") and (top_tile and top_tile.orientation[0] == "F"))
-            ),
-            "VB": lambda: (
-                    (conditions["downConnects"] and conditions["rightConnects"]) or
-                    (conditions["rightConnects"] and conditions["upDoesntConnect"]) or
-                    (conditions["downConnects"] and conditions["leftDoesntConnect"]) or
-                    (conditions["upDoesntConnect"] and conditions["leftDoesntConnect"]) or
-                    ((conditions["downConnects"] and bottom_tile and bottom_tile.orientation[0] == "F") and (left_tile and left_tile.orientation[0] == "F")) or
-                    ((conditions["rightConnects"] and right_tile and right_tile.orientation[0] == "F") and (top_tile and top_tile.orientation[0] == "F"))
-            ),
-        }
-
-        return center_conditions.get(orientation, lambda: False)()
+    @staticmethod
+    def is_center(orientation, connects, blocks, ends):
+        kind = Tile.kind(orientation)
+        closed = OPEN & ~orientation
+
+        if kind == "F":
+            # Locks if its only opening connects, or if every other side is blocked or faces another end
+            return bool(connects & orientation) or has(blocks | ends, closed)
+        if kind == "L":
+            return bool(connects & orientation or blocks & closed)
+        if kind == "B":
+            return bool(blocks & closed) or has(connects, orientation)
+
+        # Bends: a and b are the open sides, each paired with the closed side opposite to the other
+        a, b = orientation & (UP | DOWN), orientation & (LEFT | RIGHT)
+        not_a, not_b = Tile.direction_mapping[a], Tile.direction_mapping[b]
+        return bool(
+            has(connects, a | b) or
+            (connects & b and blocks & not_a) or
+            (connects & a and blocks & not_b) or
+            has(blocks, not_a | not_b) or
+            (connects & a and has(ends, a | not_b)) or
+            (connects & b and has(ends, b | not_a))
+        )
 
     def filter_moves(self, moves, row, col, tile, left_tile, right_tile, top_tile, bottom_tile):
         direction_tile_move = [
-            ("left", left_tile, "FE"),
-            ("right", right_tile, "FD"),
-            ("up", top_tile, "FC"),
-            ("down", bottom_tile, "FB")
+            (LEFT, left_tile, FE),
+            (RIGHT, right_tile, FD),
+            (UP, top_tile, FC),
+            (DOWN, bottom_tile, FB)
         ]
 
         for direction, tile_to_check, move_code in direction_tile_move:
-            if tile_to_check and ((tile_to_check.locked and not tile.connects_with(tile_to_check, direction)) or tile_to_check.orientation[0] == "F"):
+            if tile_to_check is not None and ((tile_to_check & LOCKED and not Tile.connects_with(tile_to_check, direction)) or Tile.kind(tile_to_check) == "F"):
                 if (row, col, move_code, False) in moves:
                     moves.remove((row, col, move_code, False))
 
 
 
 class Tile:
+    """Helpers over the packed cell values: the low nibble of a cell is its open-direction mask."""
 
     direction_mapping = {
-        "up": "down",
-        "down": "up",
-        "left": "right",
-        "right": "left"
+        UP: DOWN,
+        DOWN: UP,
+        LEFT: RIGHT,
+        RIGHT: LEFT
     }
 
     open_directions = {
-        "BC": ["up", "left", "right"],
-        "BE": ["up", "down", "left"],
-        "BD": ["up", "down", "right"],
-        "VC": ["up", "left"],
-        "VD": ["up", "right"],
-        "LV": ["up", "down"],
-        "FC": ["up"],
-        "VB": ["down", "right"],
-        "VE": ["down", "left"],
-        "FB": ["down"],
-        "LH": ["left", "right"],
-        "BB": ["down", "right", "left"],
-        "FD": ["right"],
-        "FE": ["left"],
+        "BC": BC,
+        "BE": BE,
+        "BD": BD,
+        "VC": VC,
+        "VD": VD,
+        "LV": LV,
+        "FC": FC,
+        "VB": VB,
+        "VE": VE,
+        "FB": FB,
+        "LH": LH,
+        "BB": BB,
+        "FD": FD,
+        "FE": FE,
     }
 
-    def __init__(self, orientation, connections=0, locked=False):
-        self.orientation = orientation
-        self.connections = connections
-        self.locked = locked
-
-    def max_connections(self):
-        orientation_type = self.orientation[0]
-        if orientation_type == "F":
-            return 1
-        elif orientation_type == "L":
-            return 2
-        elif orientation_type == "B":
-            return 3
-        elif orientation_type == "V":
-            return 2
-
-    def is_all_connected(self):
-        orientation_type = self.orientation[0]
-        if orientation_type == "F":
-            return self.connections == 1
-        elif orientation_type == "L":
-            return self.connections == 2
-        elif orientation_type == "B":
-            return self.connections == 3
-        elif orientation_type == "V":
-            return self.connections == 2
-
-    def is_connected(self, tile, direction):
-        opposite_direction = Tile.direction_mapping[direction]
-        return opposite_direction in Tile.open_directions[tile.orientation] and direction in Tile.open_directions[self.orientation]
-
-    def connects_with(self, tile, direction):
-        return Tile.direction_mapping[direction] in Tile.open_directions[tile.orientation]
-
-
-    def get_locking_orientations(self, tile_type):
-        return {
-            "F": ["FB", "FD", "FE", "FC"],
-            "L": ["LV", "LH"],
-            "B": ["BB", "BC", "BD", "BE"],
-            "V": ["VB", "VC", "VD", "VE"],
-        }.get(tile_type, [])
+    # Two-letter code of each open-direction mask (masks 0 and 15 are not pieces)
+    codes = [None] * 16
+    for code, mask in open_directions.items():
+        codes[mask] = code
+    del code, mask
+
+    # Open-direction mask of each two-letter code, indexed by its two bytes (0 for anything else),
+    # and the two bytes of the code of each mask
+    code_masks = np.zeros(1 << 16, dtype=np.uint8)
+    code_bytes = np.zeros((16, 2), dtype=np.uint8)
+    for code, mask in open_directions.items():
+        code_masks[code.encode()[0] << 8 | code.encode()[1]] = mask
+        code_bytes[mask] = list(code.encode())
+    del code, mask
+
+    locking_orientations = {
+        "F": [FB, FD, FE, FC],
+        "L": [LV, LH],
+        "B": [BB, BC, BD, BE],
+        "V": [VB, VC, VD, VE],
+    }
+
+    # Index of each mask among the orientations of its kind, and the set of all those orientations
+    orientation_index = [0] * 16
+    rotations = [0] * 16
+    for orientations in locking_orientations.values():
+        for index, mask in enumerate(orientations):
+            orientation_index[mask] = index
+            rotations[mask] = sum(1 << other for other in orientations)
+    del orientations, index, mask
+
+    # Set of the orientations open to each direction
+    opening = {direction: sum(1 << mask for mask in range(1, 15) if mask & direction)
+               for direction in (UP, RIGHT, DOWN, LEFT)}
+
+    @staticmethod
+    def kind(tile):
+        return Tile.codes[tile & OPEN][0]
+
+    @staticmethod
+    def max_connections(tile):
+        return bin(tile & OPEN).count("1")
+
+    @staticmethod
+    def is_all_connected(tile):
+        return bool(tile & CONNECTED)
+
+    @staticmethod
+    def is_connected(tile, other, direction):
+        return bool(tile & direction and other & Tile.direction_mapping[direction])
+
+    @staticmethod
+    def connects_with(other, direction):
+        return bool(other & Tile.direction_mapping[direction])
+
+    @staticmethod
+    def get_locking_orientations(tile_type):
+        return Tile.locking_orientations.get(tile_type, [])
+
+
+# The lock rules are compiled once, so that verify_locks is a single table lookup
+LOCK_TABLE = Board.compile_lock_table()
+NEIGHBOUR_KEYS = Board.compile_neighbour_keys()
 
 
 class PipeMania(Problem):
-    def __init__(self, board: Board):
+    def __init__(self, board: Board, seed=None, table_size=TABLE_SIZE, table_policy="lru"):
         initial = PipeManiaState(board)
-        self.visited_states = []
+        # layouts (orientations and locks) whose actions were already listed, with the id of the state that
+        # listed them: a different state with the same layout leads to a subtree that was searched already
+        self.transpositions = TranspositionTable(table_size, table_policy) if table_size else None
+        # with a seed, ties between branching cells and between equally constraining moves are broken at random
+        self.random = random.Random(seed) if seed is not None else None
         super().__init__(initial)
 
 
@@ -420,7 +1055,14 @@ class PipeMania(Problem):
     ### ACTION FUNCTIONS ###
     def actions(self, state: PipeManiaState):
         """Returns a list of actions that can be executed from the given state."""
-        if any(visited.compare_boards(board) for visited in self.visited_states):
+        if self.transpositions is not None:
+            board = state.layout
+            seen = self.transpositions.get(board.key)
+            if seen is not None and seen != state.id:
+                return []
+            self.transpositions.store(board.key, state.id, board.locked_count)
+
+        if not state.layout.propagate():
             return []
 
         actions = []
@@ -433,9 +1075,6 @@ class PipeMania(Problem):
         if lock_actions:
             return lock_actions
 
-        if actions:
-            return self.sort_and_filter_actions(actions)
-
         return actions
 
     def find_actions(self, state, actions, lock_actions):
@@ -454,10 +1093,10 @@ class PipeMania(Problem):
         return False
 
     def try_lock_tile(self, board, row, col, tile, actions):
-        if board.verify_locks(row, col, tile.orientation):
-            tile.locked = True
+        if board.verify_locks(row, col, tile & OPEN):
+            board.lock_tile(row, col)
 
-        if tile.locked:
+        if board.is_locked(row, col):
             return False
 
         action = self.get_locking_action(board, row, col, tile)
@@ -468,91 +1107,33 @@ class PipeMania(Problem):
         return False
 
     def get_locking_action(self, board, row, col, tile):
-        locking_orientations = Tile.get_locking_orientations(board, tile.orientation[0])
+        locking_orientations = Tile.get_locking_orientations(Tile.kind(tile))
+        locks = LOCK_TABLE[board.lock_key(row, col)] & board.fetch_domain(row, col)
 
         for orientation in locking_orientations:
-            if board.verify_locks(row, col, orientation):
+            if locks >> orientation & 1:
                 return (row, col, orientation, True)
 
         return None
 
     def find_non_locking_actions(self, state, actions, lock_actions):
+        """Branches on the most constrained unlocked cell, found from the board's rank counts."""
         board = state.layout
-        for row in range(board.cells.shape[0]):
-            for col in range(board.cells.shape[1]):
-                tile = board.fetch_tile(row, col)
-                if tile.locked or (row, col) in state.moves:
-                    continue
-
-                possible_moves = board.unified_possible_moves(row, col, state.moves)
-                self.filter_invalid_moves(possible_moves, tile, actions)
-
-    def filter_invalid_moves(self, possible_moves, tile, actions):
-        """Filter out invalid moves based on tile connectivity and update the actions list."""
-        for move in possible_moves:
-            move_tile = Tile(move[2])
-            if tile.connects_with(move_tile, "left"):
-                action = (move[0], move[1], move_tile, True)
-                if action in actions:
-                    actions.remove(action)
-                actions.append(move)
-
-    def sort_and_filter_actions(self, actions):
-        """Sort and filter actions to prioritize those with the highest locked and connected counts."""
-        # Create a dictionary to group actions by their (row, col) positions
-        action_dict = {}
-        for action in actions:
-            position = (action[0], action[1])
-            if position not in action_dict:
-                action_dict[position] = []
-            action_dict[position].append(action)
-
-        # Find the position with the maximum locked count around it
-        max_locked_count = -1
-        best_position = None
-        for position, action_list in action_dict.items():
-            locked_count = self.count_locked_around(position[0], position[1])
-            if locked_count > max_locked_count:
-                max_locked_count = locked_count
-                best_position = position
-
-        # Get the actions corresponding to the best position
-        best_actions = action_dict[best_position]
-
-        # Sort the best actions by their connection counts
-        best_actions.sort(key=lambda x: self.count_connections_around(x[0], x[1], x[2]), reverse=True)
-
-        return best_actions
-
-    def count_locked_around(self, row, col):
-        board = self.initial.layout
-        adjacent_tiles = board.horizontal_adjacent_values(row, col) + board.vertical_adjacent_values(row, col)
+        cell = board.most_constrained_cell(self.random)
+        if cell is not None:
+            actions.extend(self.sort_actions(board, board.unified_possible_moves(*cell)))
 
-        count = 0
-        for tile in adjacent_tiles:
-            if tile is not None:
-                count += 1 if tile.locked else 0.5 * sum(1 for adj_tile in board.horizontal_adjacent_values(row, col) + board.vertical_adjacent_values(row, col) if adj_tile and adj_tile.locked)
-
-        return count
-
-    def count_connections_around(self, row, col, orientation):
-        board = self.initial.layout
-        adjacent_tiles = board.horizontal_adjacent_values(row, col) + board.vertical_adjacent_values(row, col)
-
-        count = 0
-        for tile in adjacent_tiles:
-            if tile is not None and Tile(orientation).is_connected(tile, "left"):
-                count += 1
-                count += 0.5 * sum(1 for adj_tile in board.horizontal_adjacent_values(row, col) + board.vertical_adjacent_values(row, col) if adj_tile and tile.is_connected(adj_tile, "left") and adj_tile.locked)
-
-        return count
+    def sort_actions(self, board, actions):
+        """Orders the moves of a cell so that the least constraining one, which leaves the neighbours the
+        most orientations, comes last: that is the one the depth-first searches try first."""
+        if self.random is not None:
+            return sorted(actions, key=lambda action: (board.support(action[0], action[1], action[2]), self.random.random()))
+        return sorted(actions, key=lambda action: board.support(action[0], action[1], action[2]))
 
     ### RESULT FUNCTIONS ###
 
     def update_moved_tiles(self, moves, row, col):
-        moved = copy.deepcopy(moves)
-        moved.append((row, col))
-        return moved
+        return Moves((row, col), moves)
 
     def modify_board(self, board, row, col, orientation, is_locked):
         board.modify_tile_orientation(row, col, orientation)
@@ -563,11 +1144,11 @@ class PipeMania(Problem):
     def refresh_adjacent_connections(self, board, row, col):
         adjacent_positions = [(row, col), (row + 1, col), (row - 1, col), (row, col + 1), (row, col - 1)]
         for r, c in adjacent_positions:
-            if 0 <= r < board.cells.shape[0] and 0 <= c < board.cells.shape[1]:
+            if 0 <= r < board.shape[0] and 0 <= c < board.shape[1]:
                 board.refresh_connections(r, c)
 
     def lock_tile_and_adjacent(self, board, row, col):
-        board.cells[row, col].locked = True
+        board.lock_tile(row, col)
         adjacent_tiles = {
             (row - 1, col): board.vertical_adjacent_values(row, col)[0],
             (row + 1, col): board.vertical_adjacent_values(row, col)[1],
@@ -576,8 +1157,8 @@ class PipeMania(Problem):
         }
 
         for (adj_row, adj_col), adj_tile in adjacent_tiles.items():
-            if adj_tile is not None and 0 <= adj_row < board.cells.shape[0] and 0 <= adj_col < board.cells.shape[1] and board.verify_locks(adj_row, adj_col, adj_tile.orientation):
-                adj_tile.locked = True
+            if adj_tile is not None and 0 <= adj_row < board.shape[0] and 0 <= adj_col < board.shape[1] and board.verify_locks(adj_row, adj_col, adj_tile & OPEN):
+                board.lock_tile(adj_row, adj_col)
 
     def result(self, state: PipeManiaState, action):
         board = state.layout.copy()
@@ -585,10 +1166,18 @@ class PipeMania(Problem):
         moved = self.update_moved_tiles(state.moves, row, col)
 
         self.modify_board(board, row, col, orientation, is_locked)
+        board.propagate()
 
         return PipeManiaState(board, moved)
 
     def goal_test(self, state: PipeManiaState):
+        """Every tile is fully connected and the locked tiles form a single network.
+        Both counters are maintained by the board as it changes, so this is a constant-time check."""
+        board = state.layout
+        return board.connected_count == board.shape[0] * board.shape[1] and board.components == 1
+
+    def verify_solution(self, state: PipeManiaState):
+        """Checks the whole layout from scratch, independently of the counters used by goal_test."""
         visited_positions = self.initialize_visited_positions(state)
 
         if not self.all_tiles_fully_connected(state, visited_positions):
@@ -597,54 +1186,31 @@ class PipeMania(Problem):
         return self.all_positions_reachable(state, visited_positions)
 
     def initialize_visited_positions(self, state):
-        return np.full(state.layout.cells.shape, False)
+        return np.full(state.layout.shape, False)
 
     def all_tiles_fully_connected(self, state, visited_positions):
-        def is_tile_fully_connected(tile):
-            return tile.is_all_connected()
-
         board = state.layout
-        return np.all([is_tile_fully_connected(tile) for tile in board.cells.flat])
+        if board.shape[0] * board.shape[1] >= VECTORIZED_VALIDATION_CELLS:
+            return bool(board.connected_tiles().all())
+        return bool(np.all(board.cells & CONNECTED))
 
     def all_positions_reachable(self, state, visited_positions):
         """Check if all positions on the board are reachable from the starting point."""
+        if state.layout.shape[0] * state.layout.shape[1] >= VECTORIZED_VALIDATION_CELLS:
+            visited_positions[...] = state.layout.component_labels() == 0
+            return bool(np.all(visited_positions))
 
         def get_adjacent_positions(row, col, orientation):
             """Get adjacent positions based on the current tile orientation."""
-            deltas = direction_offsets.get(orientation, [])
-            return [(row + d_row, col + d_col) for d_row, d_col in deltas]
-
-        def calculate_direction_offsets():
-            """Calculate direction offsets based on tile orientations."""
-            directions = {
-                "U": (-1, 0),  # Up
-                "D": (1, 0),   # Down
-                "L": (0, -1),  # Left
-                "R": (0, 1)    # Right
-            }
-
-            def get_offsets(orientations):
-                return [directions[char] for char in orientations]
-
-            return {
-                "FC": get_offsets("U"),
-                "FD": get_offsets("R"),
-                "FE": get_offsets("L"),
-                "FB": get_offsets("D"),
-                "VC": get_offsets("UL"),
-                "VD": get_offsets("RU"),
-                "VE": get_offsets("LD"),
-                "VB": get_offsets("DR"),
-                "BB": get_offsets("DRL"),
-                "BC": get_offsets("LRU"),
-                "BD": get_offsets("RUD"),
-                "BE": get_offsets("LDU"),
-                "LV": get_offsets("UD"),
-                "LH": get_offsets("LR")
-            }
-
-        # Now you can call the function to get the direction offsets
-        direction_offsets = calculate_direction_offsets()
+            return [(row + d_row, col + d_col) for direction, (d_row, d_col) in direction_offsets.items()
+                    if orientation & direction]
+
+        direction_offsets = {
+            UP: (-1, 0),
+            DOWN: (1, 0),
+            LEFT: (0, -1),
+            RIGHT: (0, 1)
+        }
 
         frontier = [(0, 0)]
 
@@ -652,7 +1218,7 @@ class PipeMania(Problem):
             """Explore and mark all reachable positions from the starting position."""
             def is_within_bounds(r, c):
                 """Check if the given position is within the bounds of the board."""
-                return 0 <= r < state.layout.cells.shape[0] and 0 <= c < state.layout.cells.shape[1]
+                return 0 <= r < state.layout.shape[0] and 0 <= c < state.layout.shape[1]
 
             def mark_and_expand_position(row, col):
                 """Mark the current position and expand to adjacent positions."""
@@ -661,7 +1227,7 @@ class PipeMania(Problem):
                 visited_positions[row, col] = True
 
                 current_tile = state.layout.fetch_tile(row, col)
-                adjacent_positions = get_adjacent_positions(row, col, current_tile.orientation)
+                adjacent_positions = get_adjacent_positions(row, col, current_tile)
 
                 for next_row, next_col in adjacent_positions:
                     if is_within_bounds(next_row, next_col) and not visited_positions[next_row, next_col]:
@@ -678,16 +1244,308 @@ class PipeMania(Problem):
         return explore_and_mark(start_pos)
 
     def h(self, node: Node):
-        """Heuristic function used for A* search."""
-        pass
+        """Heuristic function used for A* search: the number of cells not yet locked.
+        The board keeps the locked count up to date as result locks cells, so this is constant-time.
+        A single move can lock many cells through propagation, so the estimate is not admissible;
+        it steers the search towards the most settled boards. Dead ends are put last."""
+        board = node.state.layout
+        if board.dead:
+            return np.inf
+        return board.shape[0] * board.shape[1] - board.locked_count
+
+def backtracking_search(problem: PipeMania):
+    """Depth-first search that mutates a single board in place instead of building a board per node.
+    Every write to the board is recorded on its trail; before trying the next action of a node the board
+    is rolled back to the mark taken when that node's actions were computed. Memory stays at one board
+    plus the trail of the current path, and each step costs the cells it changes. Actions are tried in
+    the same order as depth_first_tree_search. A problem with a record_expansion method (see
+    search.InstrumentedProblem) is told of every expansion; the node it keeps as best (see
+    search.BudgetedProblem) gets a copy of the board. Returns a Node holding the solved state, or None."""
+    board = problem.initial.layout.copy()
+    board.trail = []
+    state = PipeManiaState(board, problem.initial.moves)
+    record = getattr(problem, "record_expansion", None)
+
+    def expand(state):
+        if record:
+            node = Node(state)
+            node.depth = state.moves.length
+            record(node)
+            if getattr(problem, "best", None) is node:
+                node.state = PipeManiaState(board.copy(), state.moves)  # the board moves on with the search
+        return problem.actions(state)
+
+    if problem.goal_test(state):
+        board.trail = None
+        return Node(state)
+    root_actions = expand(state)  # the mark comes after, so undo keeps what actions locked, as for every child
+    stack = [(board.mark(), state.moves, reversed(root_actions))]
+
+    while stack:
+        mark, moves, actions = stack[-1]
+        action = next(actions, None)
+        board.undo(mark)
+        if action is None:
+            stack.pop()
+            continue
+
+        row, col, orientation, is_locked = action
+        state = PipeManiaState(board, problem.update_moved_tiles(moves, row, col))  # a new id for the transposition table
+        problem.modify_board(board, row, col, orientation, is_locked)
+        if not board.propagate():
+            continue
+        if problem.goal_test(state):
+            board.trail = None
+            return Node(state)
+
+        child_actions = expand(state)
+        if child_actions:
+            stack.append((board.mark(), state.moves, reversed(child_actions)))
+
+    board.trail = None
+    return None
+
+
+def sat_search(problem: PipeMania, **budget):
+    """Solves the puzzle with the CDCL solver in sat.py instead of tree search.
+    Every cell gets one variable per orientation left in its domain (exactly one of them true) and every
+    edge between two cells one variable telling whether it is open; an orientation implies the state of
+    the edges around its cell, so matching ends and closed borders are plain clauses. Connectivity is
+    added lazily: while a model splits into several networks, each network gets a cut clause saying that
+    at least one edge leaving it must be open, and the solver resumes with everything it learnt.
+    The budget keywords (max_conflicts, deadline, should_stop) are passed on to Solver.solve; without a
+    should_stop, that of the problem is used if it has one (see search.BudgetedProblem).
+    Returns a Node holding the solved state, or None."""
+    if "should_stop" not in budget and getattr(problem, "should_stop", None):
+        budget["should_stop"] = problem.should_stop
+    board = problem.initial.layout
+    rows, cols = board.shape
+    if board.dead or not rows * cols:
+        return None
+    solver = Solver()
+
+    # edge variables: the one to the right of each cell, then the one below it
+    first_edge = solver.new_vars(rows * (cols - 1) + (rows - 1) * cols)
+    right = np.arange(first_edge, first_edge + rows * (cols - 1)).reshape(rows, cols - 1)
+    down = np.arange(first_edge + right.size, first_edge + right.size + (rows - 1) * cols).reshape(rows - 1, cols)
+    choices = []  # (variable, cell, orientation) of every orientation left to a cell
+    for row in range(rows):
+        for col in range(cols):
+            edges = {UP: down.item(row - 1, col) if row else 0, RIGHT: right.item(row, col) if col + 1 < cols else 0,
+                     DOWN: down.item(row, col) if row + 1 < rows else 0, LEFT: right.item(row, col - 1) if col else 0}
+            domain = board.fetch_domain(row, col)
+            orientations = [orientation for orientation in range(16) if domain >> orientation & 1]
+            first = solver.new_vars(len(orientations))
+            choice = list(zip(range(first, first + len(orientations)), orientations))
+            choices += [(var, row * cols + col, orientation) for var, orientation in choice]
+
+            solver.add_clause([var for var, _ in choice])
+            for (a, _), (b, _) in combinations(choice, 2):
+                solver.add_clause([-a, -b])
+            for var, orientation in choice:
+                for direction, edge in edges.items():
+                    if edge:
+                        solver.add_clause([-var, edge if orientation & direction else -edge])
+                    elif orientation & direction:
+                        solver.add_clause([-var])
+
+    choice_vars, choice_cells, choice_orientations = np.array(choices).T
+    probe = Board()
+    while True:
+        if not solver.solve(**budget):
+            return None
+        chosen = solver.model[choice_vars]
+        masks = np.zeros(rows * cols, dtype=np.uint8)
+        masks[choice_cells[chosen]] = choice_orientations[chosen]
+        probe.cells = masks.reshape(rows, cols)
+
+        labels = probe.component_labels()
+        if not labels.any():
+            solved = Board.from_masks(probe.cells | LOCKED)
+            solved.refresh_all_connections()
+            return Node(PipeManiaState(solved))
+
+        # every edge between two networks is on the cut of both
+        across = labels[:, :-1] != labels[:, 1:]
+        below = labels[:-1, :] != labels[1:, :]
+        owners = np.concatenate((labels[:, :-1][across], labels[:, 1:][across], labels[:-1, :][below], labels[1:, :][below]))
+        edges = np.concatenate((right[across], right[across], down[below], down[below]))
+        order = np.argsort(owners, kind="stable")
+        owners, edges = owners[order], edges[order]
+        starts = np.flatnonzero(owners[1:] != owners[:-1]) + 1
+        for cut in np.split(edges, starts):
+            if not solver.add_clause(cut.tolist()):
+                return None
+
+
+class RegionProblem(PipeMania):
+    """The part of a PipeMania problem inside one region of unlocked cells (see Board.unlocked_regions):
+    the cells of the other regions are given no rank, so the search only branches inside
+    the region, and a state is a goal once every cell of the region is locked."""
+
+    def __init__(self, board: Board, region, seed=None):
+        board = board.copy()
+        inside = np.zeros(board.shape, dtype=bool)
+        inside[tuple(np.array(region).T)] = True
+        board.set_ranks(np.where(inside, np.vstack(board.ranks), NO_RANK))
+        super().__init__(board, seed)
+        self.region = region
+        self.target = board.locked_count + len(region)
+
+    def find_actions(self, state, actions, lock_actions):
+        board = state.layout
+        for row, col in self.region:
+            if self.try_lock_tile(board, row, col, board.fetch_tile(row, col), actions):
+                break
+
+    def goal_test(self, state: PipeManiaState):
+        board = state.layout
+        return not board.dead and board.locked_count == self.target
+
+
+def solve_region(board: Board, region, budget=None):
+    """Solves one region of the board with backtracking_search. budget, if given, holds the keyword
+    arguments of a BudgetedProblem to search the region within; SearchLimitReached is raised once it runs
+    out. Returns the open-direction masks of the region's cells, in the order of region, or None, and
+    the number of nodes expanded (None without a budget)."""
+    problem = RegionProblem(board, region)
+    if budget is not None:
+        problem = BudgetedProblem(problem, **budget)
+    try:
+        goal_node = backtracking_search(problem)
+    except SearchLimitReached as limit:
+        limit.expanded = problem.succs  # for region_search to charge
+        raise
+    expanded = problem.succs if budget is not None else None
+    if not goal_node:
+        return None, expanded
+    solved = goal_node.state.layout
+    return [solved.fetch_tile(row, col) & OPEN for row, col in region], expanded
+
+
+def region_search(problem: PipeMania, workers=1):
+    """Splits the board into regions of unlocked cells that share no neighbour, solves every region on
+    its own (on a pool of worker processes if workers > 1) and merges the pieces. The regions are only
+    independent as far as the pipes matching is concerned: if the merged board is not a single network,
+    the whole board is searched again with backtracking_search. If any region has no solution, neither
+    has the board. If the problem is a BudgetedProblem, every region is searched within what is left of
+    its budget and charged to it; on the pool, each region gets what was left when the regions were
+    handed out, and a cancel token is only checked as their solutions come back.
+    Returns a Node holding the solved state, or None."""
+    board = problem.initial.layout.copy()
+    if not board.propagate():
+        return None
+    regions = board.unlocked_regions()
+    if len(regions) < 2:
+        return backtracking_search(problem)
+
+    sub_budget = getattr(problem, "sub_budget", None)
+    solutions = []
+    try:
+        if workers > 1:
+            budget = None
+            if sub_budget:
+                budget = sub_budget()
+                budget["cancel"] = None  # a CancellationToken does not cross processes
+            executor = ProcessPoolExecutor(max_workers=workers)
+            try:
+                for solution, expanded in executor.map(solve_region, [board] * len(regions), regions,
+                                                       [budget] * len(regions)):
+                    if sub_budget:
+                        problem.charge(expanded)
+                    if solution is None:
+                        return None
+                    solutions.append(solution)
+            finally:
+                executor.shutdown(cancel_futures=True)
+        else:
+            for region in regions:
+                solution, expanded = solve_region(board, region, sub_budget() if sub_budget else None)
+                if sub_budget:
+                    problem.charge(expanded)
+                if solution is None:
+                    return None
+                solutions.append(solution)
+    except SearchLimitReached as limit:
+        problem.succs += getattr(limit, "expanded", 0)
+        raise
+
+    masks = board.cells & OPEN
+    for region, solution in zip(regions, solutions):
+        for (row, col), mask in zip(region, solution):
+            masks[row, col] = mask
+    solved = Board.from_masks(masks | LOCKED)
+    solved.refresh_all_connections()
+    state = PipeManiaState(solved)
+    if problem.goal_test(state):
+        return Node(state)
+    return backtracking_search(problem)
+
+
+# Search strategies selectable from the command line (--search)
+def without_transpositions(search):
+    """Wraps a search that expands some nodes more than once (recursive best-first search, IDA* and SMA*
+    regenerate nodes they have already expanded), which the transposition table would take for
+    revisits of searched subtrees. The table is switched off while the search runs, also when the
+    PipeMania problem is wrapped (by an InstrumentedProblem, for instance)."""
+    def run(problem, *args, **kwargs):
+        pipe_mania = problem
+        while not isinstance(pipe_mania, PipeMania):
+            pipe_mania = pipe_mania.problem
+        table, pipe_mania.transpositions = pipe_mania.transpositions, None
+        try:
+            return search(problem, *args, **kwargs)
+        finally:
+            pipe_mania.transpositions = table
+    return run
+
+
+SEARCH_STRATEGIES = {
+    "dfs": depth_first_tree_search,
+    "bfs": breadth_first_tree_search,
+    "greedy": greedy_search,
+    "astar": astar_search,
+    "rbfs": without_transpositions(recursive_best_first_search),
+    "idastar": without_transpositions(iterative_deepening_astar_search),
+    "smastar": without_transpositions(memory_bounded_astar_search),
+    "backtrack": backtracking_search,
+    "parallel": parallel_depth_first_tree_search,
+    "regions": region_search,
+    "sat": sat_search,
+}
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a PipeMania instance read from stdin.")
+    parser.add_argument("--search", choices=SEARCH_STRATEGIES, default="dfs",
+                        help="search strategy (default: dfs)")
+    parser.add_argument("--stats", help="write search statistics to this file (CSV if it ends in .csv, else JSON)")
+    parser.add_argument("--events", help="write every expand, generate and goal test to this file as JSON lines")
+    parser.add_argument("--time-limit", type=float, help="give up after this many seconds")
+    parser.add_argument("--max-nodes", type=int, help="give up after expanding this many nodes")
+    parser.add_argument("--max-memory", type=float, help="give up once the process holds this many MiB")
+    args = parser.parse_args()
+
     board = Board.parse_instance()
     problem = PipeMania(board)
 
-    goal_node = depth_first_tree_search(problem)
+    goal_node = None
+    if args.stats or args.events or args.time_limit or args.max_nodes or args.max_memory:
+        max_memory = args.max_memory * 2**20 if args.max_memory else None
+        result = budgeted_search(SEARCH_STRATEGIES[args.search], problem, max_nodes=args.max_nodes,
+                                 time_limit=args.time_limit, max_memory=max_memory, events=args.events)
+        if result.solved:
+            goal_node = result.node
+        else:
+            print(f"Search ended without a solution: {result.status}", file=sys.stderr)
+        if args.stats and args.stats.endswith(".csv"):
+            result.problem.write_csv(args.stats, search=args.search, status=result.status)
+        elif args.stats:
+            result.problem.write_json(args.stats)
+    else:
+        goal_node = SEARCH_STRATEGIES[args.search](problem)
 
     if goal_node:
-        print(goal_node.state.layout)
+        goal_node.state.layout.write()
     else:
-        print("No solution found.")
\ No newline at end of file
+        print("No solution found.")
@@ -0,0 +1,162 @@
+# Grupo 18:
+# 103902 Luís Pereira
+# 102707 Tomás Correia
+
+"""Races several solver configurations on the same board and keeps the first solution.
+
+Usage: python portfolio.py [instance.txt] [--configs NAME ...] [--workers N] [--timeout SECONDS]
+
+Each configuration runs in its own process. As soon as one of them solves the
+board, the others are terminated. A configuration is the name of one of
+pipe.SEARCH_STRATEGIES, optionally followed by ":seed" to break ties at
+random, or "restarts:seed" for randomised restarts of backtracking_search
+with a growing node limit."""
+
+import argparse
+import io
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from pipe import SEARCH_STRATEGIES, Board, PipeMania, backtracking_search
+
+DEFAULT_PORTFOLIO = ("backtrack", "sat", "restarts:1", "dfs", "backtrack:1", "greedy", "restarts:2", "backtrack:2")
+RESTART_NODES = 64  # node limit of the first restart, doubled on every restart after it
+
+
+class NodeLimitReached(Exception):
+    """Raised by LimitedProblem when the search has expanded more nodes than it is allowed."""
+
+
+class LimitedProblem:
+    """Delegates to a problem, raising NodeLimitReached once actions has been called limit times."""
+
+    def __init__(self, problem, limit: int):
+        self.problem = problem
+        self.limit = limit
+        self.expanded = 0
+
+    def actions(self, state):
+        self.expanded += 1
+        if self.expanded > self.limit:
+            raise NodeLimitReached()
+        return self.problem.actions(state)
+
+    def __getattr__(self, attr):
+        return getattr(self.problem, attr)
+
+
+def restarting_search(board: Board, seed: int):
+    """Runs backtracking_search with random tie-breaks, restarting it with a new seed and twice the
+    node limit whenever the limit is reached. Returns a Node holding the solved state, or None."""
+    limit = RESTART_NODES
+    attempt = 0
+    while True:
+        problem = LimitedProblem(PipeMania(board, seed=seed * 1000003 + attempt), limit)
+        try:
+            return backtracking_search(problem)
+        except NodeLimitReached:
+            limit *= 2
+            attempt += 1
+
+
+def run_config(data: bytes, config: str, results):
+    """Worker: solves the instance with one configuration and puts (config, solution bytes or None,
+    seconds, error message or None) on the results queue."""
+    start = time.perf_counter()
+    try:
+        strategy, _, seed = config.partition(":")
+        board = Board.from_masks(Board.read_masks(data))
+        board.presolve()
+        if strategy == "restarts":
+            goal_node = restarting_search(board, int(seed or 0))
+        else:
+            goal_node = SEARCH_STRATEGIES[strategy](PipeMania(board, int(seed) if seed else None))
+
+        solution = None
+        if goal_node:
+            output = io.BytesIO()
+            goal_node.state.layout.write(output)
+            solution = output.getvalue()
+        results.put((config, solution, time.perf_counter() - start, None))
+    except Exception as error:
+        results.put((config, None, time.perf_counter() - start, f"{type(error).__name__}: {error}"))
+
+
+def check_config(config: str):
+    strategy, _, seed = config.partition(":")
+    if strategy != "restarts" and strategy not in SEARCH_STRATEGIES:
+        raise ValueError(f"unknown strategy {strategy!r}")
+    if seed and not seed.isdigit():
+        raise ValueError(f"the seed of {config!r} must be a non-negative integer")
+    return config
+
+
+def solve_portfolio(data: bytes, configs=DEFAULT_PORTFOLIO, timeout=None, log=None):
+    """Solves the instance given as bytes with every configuration at once.
+    Returns (winning config, solution bytes), or None if no configuration found a solution in time.
+    Every worker still running when this returns is terminated. Progress lines go to log, if given."""
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    workers = [context.Process(target=run_config, args=(data, check_config(config), results), daemon=True)
+               for config in configs]
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        for worker in workers:
+            worker.start()
+        for _ in workers:
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                config, solution, seconds, error = results.get(timeout=wait)
+            except queue.Empty:
+                if log:
+                    print(f"timed out after {timeout}s", file=log)
+                return None
+            if log:
+                outcome = "solved" if solution else error or "no solution"
+                print(f"{config}: {outcome} in {seconds:.3f}s", file=log)
+            if solution:
+                return config, solution
+        return None
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a PipeMania instance with a portfolio of solver configurations.")
+    parser.add_argument("instance", nargs="?", help="instance file (default: stdin)")
+    parser.add_argument("--configs", nargs="+", type=check_config, default=None,
+                        help="configurations to race (default: the first --workers of the built-in portfolio)")
+    parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1),
+                        help="number of configurations taken from the built-in portfolio (default: the number of CPUs)")
+    parser.add_argument("--timeout", type=float, default=None, help="give up after this many seconds")
+    parser.add_argument("-v", "--verbose", action="store_true", help="report each configuration as it finishes")
+    args = parser.parse_args(argv)
+
+    if args.instance:
+        with open(args.instance, "rb") as file:
+            data = file.read()
+    else:
+        data = sys.stdin.buffer.read()
+    configs = args.configs or DEFAULT_PORTFOLIO[:max(1, args.workers)]
+
+    result = solve_portfolio(data, configs, args.timeout, sys.stderr if args.verbose else None)
+    if result is None:
+        print("No solution found.")
+        return 1
+    config, solution = result
+    sys.stdout.buffer.write(solution)
+    sys.stdout.buffer.flush()
+    if args.verbose:
+        print(f"winner: {config}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
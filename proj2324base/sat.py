@@ -0,0 +1,315 @@
+# Grupo 18:
+# 103902 Luís Pereira
+# 102707 Tomás Correia
+
+"""A conflict-driven clause-learning (CDCL) SAT solver in plain Python.
+
+Variables are numbered from 1 and literals are DIMACS-style integers: v is
+"variable v is true" and -v is "variable v is false". Clauses may be added
+between calls to solve, so a caller can refine the formula lazily (for
+instance with cuts that rule out a model it rejected) while keeping every
+clause learnt so far.
+
+The solver uses two watched literals per clause, first-UIP conflict
+analysis with non-chronological backjumping, VSIDS branching with phase
+saving, and Luby restarts."""
+
+import heapq
+import time
+
+import numpy as np
+
+
+class Solver:
+    """Incremental CDCL solver. Internally literal v is 2*v and -v is 2*v + 1, so negation is l ^ 1."""
+
+    restart_unit = 100  # conflicts per Luby unit
+    activity_decay = 0.95
+
+    def __init__(self, num_vars: int = 0):
+        self.num_vars = 0
+        self.values = [0, 0]  # per internal literal: 1 true, -1 false, 0 unassigned
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        self.phase = [False]
+        self.watches = [[], []]
+        self.binaries = [[], []]  # per literal: (other literal, clause index) of the binary clauses it is in
+        self.clauses = []
+        self.trail = []
+        self.trail_limits = []  # trail length at the start of every decision level
+        self.queue_head = 0
+        self.heap = []
+        self.activity_increment = 1.0
+        self.ok = True  # False once the formula is known to be unsatisfiable
+        self.conflicts = 0
+        self.decisions = 0
+        self.propagations = 0
+        self.model = None
+        self.new_vars(num_vars)
+
+    def new_vars(self, count: int):
+        """Adds count variables and returns the number of the first one."""
+        first = self.num_vars + 1
+        for var in range(first, first + count):
+            self.values += [0, 0]
+            self.levels.append(0)
+            self.reasons.append(None)
+            self.activity.append(0.0)
+            self.phase.append(False)
+            self.watches += [[], []]
+            self.binaries += [[], []]
+            heapq.heappush(self.heap, (0.0, var))
+        self.num_vars += count
+        return first
+
+    @staticmethod
+    def internal(literal: int):
+        return 2 * literal if literal > 0 else -2 * literal + 1
+
+    def add_clause(self, literals):
+        """Adds a clause of DIMACS literals. Returns False if the formula became unsatisfiable.
+        The clause may be added in the middle of a search, for instance while the last model is still
+        assigned: the solver then only backjumps as far as needed for the clause to be watched
+        correctly, asserting its last literal if it has become unit, so the rest of the assignment
+        is kept for the next call to solve."""
+        if not self.ok:
+            return False
+
+        clause = []
+        for literal in set(map(Solver.internal, literals)):
+            value = self.values[literal]
+            at_root = self.levels[literal >> 1] == 0
+            if literal ^ 1 in clause or (value == 1 and at_root):
+                return True  # a tautology, or satisfied for good
+            if not (value == -1 and at_root):
+                clause.append(literal)
+
+        if not clause:
+            self.ok = False
+            return False
+        if len(clause) == 1:
+            self.backtrack(0)
+            self.assign(clause[0], None)
+            self.ok = self.propagate() is None
+            return self.ok
+
+        # watch true or unassigned literals first, then the false ones assigned last
+        clause.sort(key=lambda literal: (self.values[literal] != -1, self.levels[literal >> 1]), reverse=True)
+        first, second = clause[0], clause[1]
+        if self.values[second] == -1:
+            second_level = self.levels[second >> 1]
+            if self.values[first] == -1 and self.levels[first >> 1] == second_level:
+                self.backtrack(second_level - 1)
+                self.attach(clause)
+                return True
+            self.backtrack(second_level)
+            index = self.attach(clause)
+            if not self.values[first]:
+                self.assign(first, index)
+            return True
+        self.attach(clause)
+        return True
+
+    def attach(self, clause):
+        """Stores a clause of two or more literals and starts watching it. Binary clauses are kept
+        in implication lists instead, which propagate without moving any watch."""
+        index = len(self.clauses)
+        self.clauses.append(clause)
+        if len(clause) == 2:
+            self.binaries[clause[0]].append((clause[1], index))
+            self.binaries[clause[1]].append((clause[0], index))
+        else:
+            self.watches[clause[0]].append(index)
+            self.watches[clause[1]].append(index)
+        return index
+
+    def assign(self, literal: int, reason):
+        var = literal >> 1
+        self.values[literal] = 1
+        self.values[literal ^ 1] = -1
+        self.levels[var] = len(self.trail_limits)
+        self.reasons[var] = reason
+        self.trail.append(literal)
+
+    def propagate(self):
+        """Propagates every assignment on the trail through the watched literals.
+        Returns the index of a conflicting clause, or None."""
+        values, clauses, watches, binaries = self.values, self.clauses, self.watches, self.binaries
+        trail = self.trail
+        while self.queue_head < len(trail):
+            false_literal = trail[self.queue_head] ^ 1
+            self.queue_head += 1
+            self.propagations += 1
+            for other, index in binaries[false_literal]:
+                value = values[other]
+                if value == -1:
+                    return index
+                if not value:
+                    self.assign(other, index)
+
+            watching = watches[false_literal]
+            kept = []
+            for position, index in enumerate(watching):
+                clause = clauses[index]
+                if clause[0] == false_literal:
+                    clause[0], clause[1] = clause[1], false_literal
+                first = clause[0]
+                if values[first] == 1:
+                    kept.append(index)
+                    continue
+                for k in range(2, len(clause)):
+                    if values[clause[k]] != -1:
+                        clause[1], clause[k] = clause[k], false_literal
+                        watches[clause[1]].append(index)
+                        break
+                else:
+                    kept.append(index)
+                    if values[first] == -1:
+                        kept.extend(watching[position + 1:])
+                        watches[false_literal] = kept
+                        return index
+                    self.assign(first, index)
+            watches[false_literal] = kept
+        return None
+
+    def analyze(self, conflict: int):
+        """Derives the first-UIP clause of a conflict. Returns it, asserting literal first,
+        with the level to backjump to. The literal a reason clause implied is skipped by variable,
+        since binary clauses do not keep it in front."""
+        level = len(self.trail_limits)
+        seen = set()
+        learnt = [None]
+        pending = 0
+        literal = None
+        clause = self.clauses[conflict]
+        index = len(self.trail) - 1
+        while True:
+            for other in clause:
+                var = other >> 1
+                if var not in seen and self.levels[var] > 0 and other != literal:
+                    seen.add(var)
+                    self.bump(var)
+                    if self.levels[var] == level:
+                        pending += 1
+                    else:
+                        learnt.append(other)
+            while self.trail[index] >> 1 not in seen:
+                index -= 1
+            literal = self.trail[index]
+            index -= 1
+            seen.discard(literal >> 1)
+            pending -= 1
+            if not pending:
+                break
+            clause = self.clauses[self.reasons[literal >> 1]]
+        learnt[0] = literal ^ 1
+
+        if len(learnt) == 1:
+            return learnt, 0
+        deepest = max(range(1, len(learnt)), key=lambda i: self.levels[learnt[i] >> 1])
+        learnt[1], learnt[deepest] = learnt[deepest], learnt[1]
+        return learnt, self.levels[learnt[1] >> 1]
+
+    def bump(self, var: int):
+        self.activity[var] += self.activity_increment
+        if self.activity[var] > 1e100:
+            self.activity = [value * 1e-100 for value in self.activity]
+            self.activity_increment *= 1e-100
+            self.heap = [(-self.activity[v], v) for v in range(1, self.num_vars + 1) if not self.values[2 * v]]
+            heapq.heapify(self.heap)
+        elif not self.values[2 * var]:
+            heapq.heappush(self.heap, (-self.activity[var], var))
+
+    def backtrack(self, level: int):
+        if len(self.trail_limits) <= level:
+            return
+        start = self.trail_limits[level]
+        for literal in self.trail[start:]:
+            var = literal >> 1
+            self.values[literal] = self.values[literal ^ 1] = 0
+            self.reasons[var] = None
+            self.phase[var] = not literal & 1
+            heapq.heappush(self.heap, (-self.activity[var], var))
+        del self.trail[start:]
+        del self.trail_limits[level:]
+        self.queue_head = len(self.trail)
+        if len(self.heap) > 4 * self.num_vars + 64:
+            self.heap = list({(-self.activity[v], v) for _, v in self.heap if not self.values[2 * v]})
+            heapq.heapify(self.heap)
+
+    def pick_branch(self):
+        """Returns the literal of the most active unassigned variable, in its saved phase, or None."""
+        while self.heap:
+            activity, var = heapq.heappop(self.heap)
+            if not self.values[2 * var] and -activity == self.activity[var]:
+                return 2 * var if self.phase[var] else 2 * var + 1
+        for var in range(1, self.num_vars + 1):
+            if not self.values[2 * var]:
+                return 2 * var if self.phase[var] else 2 * var + 1
+        return None
+
+    @staticmethod
+    def luby(index: int):
+        """The index-th term (from 0) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, ..."""
+        size, power = 1, 0
+        while size < index + 1:
+            power += 1
+            size = 2 * size + 1
+        while size - 1 != index:
+            size = (size - 1) >> 1
+            power -= 1
+            index %= size
+        return 1 << power
+
+    def solve(self, max_conflicts=None, deadline=None, should_stop=None):
+        """Searches for a model. Returns True (the model is then in self.model and value()),
+        False if the formula is unsatisfiable, or None if a budget ran out first: max_conflicts,
+        a time.monotonic() deadline, or a should_stop() callback polled at every conflict."""
+        if not self.ok:
+            return False
+        self.model = None
+
+        restarts = 0
+        restart_limit = self.restart_unit * Solver.luby(restarts)
+        conflicts_here = 0
+        budget = None if max_conflicts is None else self.conflicts + max_conflicts
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                conflicts_here += 1
+                if not self.trail_limits:
+                    self.ok = False
+                    return False
+                learnt, level = self.analyze(conflict)
+                self.backtrack(level)
+                if len(learnt) == 1:
+                    self.assign(learnt[0], None)
+                else:
+                    self.assign(learnt[0], self.attach(learnt))
+                self.activity_increment /= self.activity_decay
+
+                if (budget is not None and self.conflicts >= budget) \
+                        or (deadline is not None and time.monotonic() >= deadline) \
+                        or (should_stop is not None and should_stop()):
+                    self.backtrack(0)
+                    return None
+                if conflicts_here >= restart_limit:
+                    restarts += 1
+                    restart_limit = self.restart_unit * Solver.luby(restarts)
+                    conflicts_here = 0
+                    self.backtrack(0)
+                continue
+
+            literal = self.pick_branch()
+            if literal is None:
+                self.model = np.array(self.values[::2]) == 1  # indexed by variable, 0 unused
+                return True
+            self.decisions += 1
+            self.trail_limits.append(len(self.trail))
+            self.assign(literal, None)
+
+    def value(self, var: int):
+        """The value of a variable in the last model found."""
+        return bool(self.model[var])
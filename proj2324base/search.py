@@ -6,8 +6,18 @@ then create problem instances and solve them with calls to the various search
 functions.
 """
 
+import csv
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import queue
 import sys
-from collections import deque
+import threading
+import time
+import types
+from collections import Counter, deque
 
 from utils import *
 
@@ -92,7 +102,11 @@ class Node:
         return self.state < node.state
 
     def expand(self, problem):
-        """List the nodes reachable in one step from this node."""
+        """List the nodes reachable in one step from this node.
+        A problem with a record_expansion method (see InstrumentedProblem) is told of the expansion first."""
+        record = getattr(problem, 'record_expansion', None)
+        if record is not None:
+            record(self)
         return [self.child_node(problem, action)
                 for action in problem.actions(self.state)]
 
@@ -213,6 +227,131 @@ def depth_first_tree_search(problem):
     return None
 
 
+def parallel_depth_first_tree_search(problem, workers=None, split=4, share_every=16):
+    """
+    Depth-first tree search spread over worker processes.
+    The top of the tree is expanded breadth-first until there are split
+    subtrees per worker; each worker then searches the subtrees it takes
+    depth-first on a stack of its own. While some worker is idle, busy
+    workers hand over the shallowest node of their stack (the largest
+    unexplored subtree they hold), checking every share_every expansions.
+    The first worker to reach a goal sets a stop flag shared by all of them.
+    Nodes travel between processes pickled, parents included, so the
+    states of the problem should pickle compactly.
+    The node returned may not be the one depth_first_tree_search finds.
+    A daemonic process cannot start workers, so it searches serially.
+    The counters of an InstrumentedProblem are sent back by every worker and
+    added to the parent's.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or multiprocessing.current_process().daemon:
+        return depth_first_tree_search(problem)
+
+    frontier = deque([Node(problem.initial)])
+    while frontier and len(frontier) < split * workers:
+        node = frontier.popleft()
+        if problem.goal_test(node.state):
+            return node
+        frontier.extend(node.expand(problem))
+    if not frontier:
+        return None
+
+    context = multiprocessing.get_context()
+    tasks, results = context.Queue(), context.Queue()
+    shared = context.Value('i', 0)  # outstanding tasks, guarded by the lock of idle
+    idle = context.Value('i', 0)  # workers waiting for a task
+    stop = context.Event()
+    for node in reversed(frontier):  # leftmost subtrees first, as depth_first_tree_search
+        tasks.put(node)
+    shared.value = len(frontier)
+
+    processes = [context.Process(target=_depth_first_worker, daemon=True,
+                                 args=(problem, workers, share_every, tasks, results, shared, idle, stop))
+                 for _ in range(workers)]
+    counters = getattr(problem, 'counters', None)
+    base = counters() if counters else None  # what every worker starts from
+    started = []
+    received = 0
+    try:
+        for process in processes:
+            process.start()
+            started.append(process)
+        for _ in processes:
+            found, worker_counters = results.get()
+            received += 1
+            if base:
+                problem.add_counters(worker_counters, base)
+            if isinstance(found, Exception):
+                raise found
+            if found is not None:
+                return found
+        return None
+    finally:
+        stop.set()
+        if base:  # the workers still searching stop and report what they did
+            for _ in range(len(started) - received):
+                try:
+                    problem.add_counters(results.get(timeout=1)[1], base)
+                except queue.Empty:
+                    break
+        # nodes left on the queues are never read, so the feeder threads must not wait to flush them at exit
+        tasks.cancel_join_thread()
+        results.cancel_join_thread()
+        for process in started:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+def _depth_first_worker(problem, workers, share_every, tasks, results, shared, idle, stop):
+    """Worker of parallel_depth_first_tree_search: takes tasks until every worker is idle with none left,
+    sharing its shallowest node whenever another worker is waiting. Puts a goal node, None, or the exception
+    that stopped it on results, with the counters of an InstrumentedProblem."""
+    counters = getattr(problem, 'counters', None)
+    stack = []
+    expansions = 0
+    tasks.cancel_join_thread()  # on a stop, nodes shared but never taken may be dropped
+    with idle.get_lock():
+        idle.value += 1
+    try:
+        while not stop.is_set():
+            if not stack:
+                try:
+                    node = tasks.get(timeout=0.01)
+                except queue.Empty:
+                    with idle.get_lock():
+                        if idle.value == workers and not shared.value:
+                            break  # nobody is searching and no task is in flight
+                    continue
+                with idle.get_lock():
+                    idle.value -= 1
+                    shared.value -= 1
+                stack.append(node)
+
+            node = stack.pop()
+            if problem.goal_test(node.state):
+                stop.set()
+                results.put((node, counters and counters()))
+                return
+            stack.extend(node.expand(problem))
+
+            expansions += 1
+            if expansions % share_every == 0 and len(stack) > 1 and idle.value:
+                with idle.get_lock():
+                    shared.value += 1
+                tasks.put(stack.pop(0))
+
+            if not stack:
+                with idle.get_lock():
+                    idle.value += 1
+    except Exception as error:  # a failure, or a limit of a BudgetedProblem, ends the whole search
+        stop.set()
+        results.put((error, counters and counters()))
+        return
+    results.put((None, counters and counters()))
+
+
 def depth_first_graph_search(problem):
     """
     [Figure 3.7]
@@ -221,20 +360,33 @@ def depth_first_graph_search(problem):
     The argument frontier should be an empty queue.
     Does not get trapped by loops.
     If two paths reach a state, only use the first one.
+    The states on the frontier are also counted in a hash table, so that
+    checking whether a child is already on it does not scan the stack.
     """
     frontier = [(Node(problem.initial))]  # Stack
+    in_frontier = Counter([frontier[0].state])
 
     explored = set()
     while frontier:
         node = frontier.pop()
+        forget_frontier_state(in_frontier, node.state)
         if problem.goal_test(node.state):
             return node
         explored.add(node.state)
-        frontier.extend(child for child in node.expand(problem)
-                        if child.state not in explored and child not in frontier)
+        for child in node.expand(problem):
+            if child.state not in explored and child.state not in in_frontier:
+                frontier.append(child)
+                in_frontier[child.state] += 1
     return None
 
 
+def forget_frontier_state(in_frontier, state):
+    """Takes one node of a state off the frontier counts kept by the graph searches."""
+    in_frontier[state] -= 1
+    if not in_frontier[state]:
+        del in_frontier[state]
+
+
 def breadth_first_graph_search(problem):
     """[Figure 3.11]
     Note that this function can be implemented in a
@@ -245,15 +397,18 @@ def breadth_first_graph_search(problem):
     if problem.goal_test(node.state):
         return node
     frontier = deque([node])
+    in_frontier = Counter([node.state])  # states on the frontier, as in depth_first_graph_search
     explored = set()
     while frontier:
         node = frontier.popleft()
+        forget_frontier_state(in_frontier, node.state)
         explored.add(node.state)
         for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
+            if child.state not in explored and child.state not in in_frontier:
                 if problem.goal_test(child.state):
                     return child
                 frontier.append(child)
+                in_frontier[child.state] += 1
     return None
 
 
@@ -332,18 +487,21 @@ def bidirectional_search(problem):
         e = problem.find_min_edge()
     gF, gB = {Node(problem.initial): 0}, {Node(problem.goal): 0}
     openF, openB = [Node(problem.initial)], [Node(problem.goal)]
-    closedF, closedB = [], []
+    # the open lists keep their order for find_key; membership is tested on these sets
+    open_setF, open_setB = set(openF), set(openB)
+    closedF, closedB = set(), set()
     U = np.inf
 
-    def extend(U, open_dir, open_other, g_dir, g_other, closed_dir):
+    def extend(U, open_dir, open_other, g_dir, g_other, closed_dir, open_set_dir, open_set_other):
         """Extend search in given direction"""
         n = find_key(C, open_dir, g_dir)
 
         open_dir.remove(n)
-        closed_dir.append(n)
+        open_set_dir.discard(n)
+        closed_dir.add(n)
 
         for c in n.expand(problem):
-            if c in open_dir or c in closed_dir:
+            if c in open_set_dir or c in closed_dir:
                 if g_dir[c] <= problem.path_cost(g_dir[n], n.state, None, c.state):
                     continue
 
@@ -351,8 +509,9 @@ def bidirectional_search(problem):
 
             g_dir[c] = problem.path_cost(g_dir[n], n.state, None, c.state)
             open_dir.append(c)
+            open_set_dir.add(c)
 
-            if c in open_other:
+            if c in open_set_other:
                 U = min(U, g_dir[c] + g_other[c])
 
         return U, open_dir, closed_dir, g_dir
@@ -394,10 +553,10 @@ def bidirectional_search(problem):
 
         if C == pr_min_f:
             # Extend forward
-            U, openF, closedF, gF = extend(U, openF, openB, gF, gB, closedF)
+            U, openF, closedF, gF = extend(U, openF, openB, gF, gB, closedF, open_setF, open_setB)
         else:
             # Extend backward
-            U, openB, closedB, gB = extend(U, openB, openF, gB, gF, closedB)
+            U, openB, closedB, gB = extend(U, openB, openF, gB, gF, closedB, open_setB, open_setF)
 
     return np.inf
 
@@ -423,6 +582,149 @@ def astar_search(problem, h=None, display=False):
     return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display)
 
 
+def iterative_deepening_astar_search(problem, h=None, table=None):
+    """Iterative-deepening A* (IDA*): depth-first searches bounded by f(n) = g(n)+h(n),
+    each with the bound raised to the smallest f that exceeded the last one.
+    The depth-first search runs on an explicit stack rather than recursion, so
+    deep solutions do not hit the recursion limit; it only keeps the siblings
+    of the current path. A child with the state of its grandparent is skipped.
+    If a TranspositionTable is given, it maps each state to the smallest g it
+    was expanded with during the current iteration, and nodes that reach a
+    state again without a smaller g are pruned; it is cleared every iteration."""
+    h = memoize(h or problem.h, 'h')
+    root = Node(problem.initial)
+    bound = h(root)
+    while True:
+        next_bound = np.inf
+        if table is not None:
+            table.clear()
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            f = node.path_cost + h(node)
+            if f > bound:
+                next_bound = min(next_bound, f)
+                continue
+            if problem.goal_test(node.state):
+                return node
+            if table is not None:
+                seen = table.get(node.state)
+                if seen is not None and seen <= node.path_cost:
+                    continue
+                table.store(node.state, node.path_cost, node.depth)
+            grandparent = node.parent.state if node.parent else None
+            # reversed, so that the first child is expanded first, as in the recursive version
+            stack.extend(child for child in reversed(node.expand(problem)) if child.state != grandparent)
+        if next_bound == np.inf:
+            return None
+        bound = next_bound
+
+
+def memory_bounded_astar_search(problem, h=None, max_nodes=10000, table=None):
+    """[Section 3.5.3] Simplified memory-bounded A* (SMA*): A* that keeps at most
+    max_nodes nodes in memory. When memory is full it forgets the leaf with the
+    highest f (the shallowest one on ties), and remembers its f in its parent,
+    so the parent's subtree is only regenerated once it looks better than every
+    other node again. f values are backed up from the children to the parents.
+    A node that cannot reach a goal without more than max_nodes nodes on its
+    path gets f = infinity. A child with the state of its grandparent is skipped.
+    If a TranspositionTable is given, it maps the states of the nodes in memory
+    to the g they were generated with, and a child whose state is already in
+    memory with no greater g is not generated; forgotten nodes leave the table.
+    Returns the goal node, or None."""
+    h = memoize(h or problem.h, 'h')
+    stamps = itertools.count()
+    # lazy heaps of the nodes on OPEN, an entry being valid while its stamp is the node's: best holds them
+    # all, worst only those without children in memory, which are the ones that can be forgotten
+    best, worst = [], []
+
+    def enqueue(node, f):
+        node.open_stamp = next(stamps)
+        heapq.heappush(best, (f, -node.depth, node.open_stamp, node))
+        if not node.children:
+            heapq.heappush(worst, (-f, node.depth, node.open_stamp, node))
+
+    def pop_valid(heap):
+        while heap:
+            entry = heapq.heappop(heap)
+            if entry[3].open_stamp == entry[2]:
+                return entry
+        return None
+
+    def new_node(node, f):
+        node.f = f
+        node.children = {}  # action -> child still in memory
+        node.forgotten = {}  # action -> backed-up f of a forgotten child
+        node.open_stamp = None
+        return node
+
+    def backup(node):
+        while node is not None:
+            values = [child.f for child in node.children.values()] + list(node.forgotten.values())
+            f = min(values) if values else np.inf
+            if f == node.f:
+                break
+            node.f = f
+            node = node.parent
+
+    record = getattr(problem, 'record_expansion', None)  # told of every expansion, as by Node.expand
+    root = new_node(Node(problem.initial), None)
+    root.f = h(root)
+    enqueue(root, root.f)
+    used = 1
+    while True:
+        entry = pop_valid(best)
+        if entry is None or entry[0] == np.inf:
+            return None
+        node = entry[3]
+        if problem.goal_test(node.state):
+            return node
+        node.open_stamp = None
+
+        forgotten, node.forgotten = node.forgotten, {}
+        grandparent = node.parent.state if node.parent else None
+        if record is not None:
+            record(node)
+        for action in problem.actions(node.state):
+            if action in node.children:
+                continue
+            child = node.child_node(problem, action)
+            if child.state == grandparent:
+                continue
+            if table is not None:
+                seen = table.get(child.state)
+                if seen is not None and seen <= child.path_cost:
+                    continue
+                table.store(child.state, child.path_cost, child.depth)
+            if child.depth >= max_nodes - 1 and not problem.goal_test(child.state):
+                f = np.inf
+            else:
+                f = max(node.f, child.path_cost + h(child), forgotten.get(action, 0))
+            node.children[action] = new_node(child, f)
+            enqueue(child, f)
+            used += 1
+        if node.children:
+            backup(node)
+        else:
+            node.f = np.inf  # a dead end, forgotten first when memory runs out
+            enqueue(node, np.inf)
+            backup(node.parent)
+
+        while used > max_nodes:
+            entry = pop_valid(worst)
+            if entry is None or entry[3] is root:
+                break
+            leaf = entry[3]
+            leaf.open_stamp = None
+            if table is not None:
+                table.discard(leaf.state)
+            parent = leaf.parent
+            del parent.children[leaf.action]
+            parent.forgotten[leaf.action] = leaf.f
+            used -= 1
+            enqueue(parent, min(parent.forgotten.values()))
+
+
 # ______________________________________________________________________________
 # A* heuristics
 
@@ -1518,24 +1820,95 @@ def mutate_boggle(board):
 
 
 class InstrumentedProblem(Problem):
-    """Delegates to a problem, and keeps statistics."""
-
-    def __init__(self, problem):
+    """Delegates to a problem, and keeps statistics.
+    Besides counting calls it times actions, result and goal_test, and keeps
+    the deepest node expanded (searches report their expansions through
+    Node.expand), the peak number of nodes generated but not yet expanded (the
+    frontier, for the searches that expand what they generate), the bytes each
+    sampled node adds to its parent's (the average is bytes_per_node), and a timeline of the counters taken
+    every timeline_interval seconds. report() gathers it all; write_json and
+    write_csv export it. If events is a path or a text file, every expand,
+    generate and goal test is also written to it as a line of JSON."""
+
+    def __init__(self, problem, events=None, sample_every=256, timeline_interval=0.1):
         self.problem = problem
         self.succs = self.goal_tests = self.states = 0
         self.found = None
+        self.time_actions = self.time_result = self.time_goal_test = 0.0
+        self.max_depth = 0
+        self.peak_frontier = 1
+        self.expanding_depth = None  # depth of the node Node.expand is about to list the actions of
+        self.sample_every = sample_every
+        self.node_bytes = []  # sizes of the sampled nodes
+        self.timeline_interval = timeline_interval
+        self.timeline = []
+        self.start = self.last = time.perf_counter()
+        self.next_sample = self.start + timeline_interval
+        self.owns_events = isinstance(events, str)
+        self.events = open(events, 'w') if self.owns_events else events
+
+    def counters(self):
+        """The counters kept so far, as a dict that add_counters can add to another copy of this problem."""
+        return {'expanded': self.succs, 'generated': self.states, 'goal_tests': self.goal_tests,
+                'time_actions': self.time_actions, 'time_result': self.time_result,
+                'time_goal_test': self.time_goal_test, 'max_depth': self.max_depth,
+                'peak_frontier': self.peak_frontier, 'node_bytes': list(self.node_bytes), 'found': self.found}
+
+    def add_counters(self, counters, base):
+        """Add what a copy of this problem did after its counters were base (in another process, say).
+        max_depth and peak_frontier become the largest of either."""
+        self.succs += counters['expanded'] - base['expanded']
+        self.states += counters['generated'] - base['generated']
+        self.goal_tests += counters['goal_tests'] - base['goal_tests']
+        self.time_actions += counters['time_actions'] - base['time_actions']
+        self.time_result += counters['time_result'] - base['time_result']
+        self.time_goal_test += counters['time_goal_test'] - base['time_goal_test']
+        self.max_depth = max(self.max_depth, counters['max_depth'])
+        self.peak_frontier = max(self.peak_frontier, counters['peak_frontier'])
+        self.node_bytes = self.node_bytes + counters['node_bytes'][len(base['node_bytes']):]
+        if counters['found'] is not None:
+            self.found = counters['found']
+        self.last = time.perf_counter()
+
+    def record_expansion(self, node):
+        self.expanding_depth = node.depth
+        self.max_depth = max(self.max_depth, node.depth)
+        # the root would count everything the problem shares with all nodes, so sampling starts below it
+        if node.parent is not None and (not self.node_bytes or self.succs % self.sample_every == 0):
+            self.node_bytes.append(node_size(node))
 
     def actions(self, state):
         self.succs += 1
-        return self.problem.actions(state)
+        start = time.perf_counter()
+        actions = self.problem.actions(state)
+        self.last = time.perf_counter()
+        self.time_actions += self.last - start
+        if self.events:
+            self.emit('expand', state=state_hash(state), depth=self.expanding_depth, actions=len(actions))
+        self.expanding_depth = None
+        if self.last >= self.next_sample:
+            self.sample()
+        return actions
 
     def result(self, state, action):
         self.states += 1
-        return self.problem.result(state, action)
+        start = time.perf_counter()
+        result = self.problem.result(state, action)
+        self.last = time.perf_counter()
+        self.time_result += self.last - start
+        self.peak_frontier = max(self.peak_frontier, self.frontier())
+        if self.events:
+            self.emit('generate', state=state_hash(result), parent=state_hash(state))
+        return result
 
     def goal_test(self, state):
         self.goal_tests += 1
+        start = time.perf_counter()
         result = self.problem.goal_test(state)
+        self.last = time.perf_counter()
+        self.time_goal_test += self.last - start
+        if self.events:
+            self.emit('goal_test', state=state_hash(state), result=bool(result))
         if result:
             self.found = state
         return result
@@ -1546,6 +1919,67 @@ class InstrumentedProblem(Problem):
     def value(self, state):
         return self.problem.value(state)
 
+    def frontier(self):
+        """Nodes generated and not expanded yet, the root included."""
+        return max(0, 1 + self.states - self.succs)
+
+    def emit(self, event, **fields):
+        self.events.write(json.dumps({'event': event, 't': round(self.last - self.start, 6), **fields}) + '\n')
+
+    def sample(self):
+        self.timeline.append({'time': self.last - self.start, 'expanded': self.succs, 'generated': self.states,
+                              'goal_tests': self.goal_tests, 'frontier': self.frontier()})
+        self.next_sample = self.last + self.timeline_interval
+
+    def report(self):
+        """Return the statistics gathered so far as a dict."""
+        elapsed = self.last - self.start
+        timeline = self.timeline + [{'time': elapsed, 'expanded': self.succs, 'generated': self.states,
+                                     'goal_tests': self.goal_tests, 'frontier': self.frontier()}]
+        previous = {'time': 0.0, 'expanded': 0}
+        for point in timeline:
+            span = point['time'] - previous['time']
+            point['nodes_per_second'] = (point['expanded'] - previous['expanded']) / span if span > 0 else 0.0
+            previous = point
+        return {
+            'problem': name(self.problem),
+            'solved': self.found is not None,
+            'expanded': self.succs,
+            'generated': self.states,
+            'goal_tests': self.goal_tests,
+            'elapsed': elapsed,
+            'nodes_per_second': self.succs / elapsed if elapsed > 0 else 0.0,
+            'time_actions': self.time_actions,
+            'time_result': self.time_result,
+            'time_goal_test': self.time_goal_test,
+            'max_depth': self.max_depth,
+            'peak_frontier': self.peak_frontier,
+            'bytes_per_node': sum(self.node_bytes) / len(self.node_bytes) if self.node_bytes else None,
+            'timeline': timeline,
+        }
+
+    def write_json(self, path):
+        """Write report() to path as JSON."""
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=2)
+
+    def write_csv(self, path, **columns):
+        """Append the report, without its timeline, as one row of the CSV file at path, after any extra
+        columns given (a search name, say); the header is written when the file is new."""
+        row = {**columns, **self.report()}
+        del row['timeline']
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, 'a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(row))
+            if new:
+                writer.writeheader()
+            writer.writerow(row)
+
+    def close(self):
+        """Close the event stream if it was opened from a path."""
+        if self.owns_events:
+            self.events.close()
+
     def __getattr__(self, attr):
         return getattr(self.problem, attr)
 
@@ -1554,6 +1988,216 @@ class InstrumentedProblem(Problem):
                                                self.states, str(self.found)[:4])
 
 
+def state_hash(state):
+    """The hash of a state for the event stream, or None if it is not hashable."""
+    try:
+        return hash(state)
+    except TypeError:
+        return None
+
+
+def node_size(node):
+    """Approximate bytes a node adds to memory: everything it references, not counting what its parent
+    (without the rest of the path) already references, so data shared with the parent is left out."""
+    seen = set()
+    if node.parent is not None:
+        seen.add(id(node.parent.parent))
+        object_size(node.parent, seen)
+    else:
+        seen.add(id(None))
+    return object_size(node, seen)
+
+
+def object_size(obj, seen):
+    """Bytes of obj and of the objects it references that are not in seen (a set of ids), adding them to it.
+    numpy arrays count their buffer; classes, modules and functions are not followed."""
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, np.ndarray):
+            if obj.base is not None:
+                total += obj.nbytes
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+    return total
+
+
+class SearchLimitReached(Exception):
+    """Raised inside a search by BudgetedProblem when a limit is reached; reason names the limit."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancellationToken:
+    """Lets another thread, or a signal handler, stop a budgeted search of this process."""
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+
+class BudgetedProblem(InstrumentedProblem):
+    """An InstrumentedProblem that stops the search, by raising SearchLimitReached
+    from actions, once it has expanded max_nodes nodes, time_limit seconds have
+    passed, the process holds more than max_memory bytes, or cancel (a
+    CancellationToken) is cancelled. The clock is read at every expansion, the
+    memory every check_every expansions. progress, if given, is called with
+    progress_stats() every progress_interval seconds. The best node expanded so
+    far is kept in best: the one with the lowest h if the problem has an h,
+    then the deepest. Searches that do not expand nodes through actions can
+    poll should_stop() instead. deadline, a time.monotonic() time, can be given
+    instead of (or as well as) time_limit."""
+
+    def __init__(self, problem, max_nodes=None, time_limit=None, max_memory=None, cancel=None,
+                 progress=None, progress_interval=1.0, check_every=64, events=None, deadline=None):
+        super().__init__(problem, events)
+        self.max_nodes = max_nodes
+        if time_limit is not None:
+            limit = time.monotonic() + time_limit
+            deadline = limit if deadline is None else min(deadline, limit)
+        self.deadline = deadline
+        self.max_memory = max_memory
+        self.cancel = cancel
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.next_progress = time.monotonic() + progress_interval
+        self.check_every = check_every
+        self.heuristic = getattr(problem, 'h', None)
+        self.best = None
+        self.best_key = None
+        self.stopped = None  # the limit that stopped the search, if any
+
+    def record_expansion(self, node):
+        super().record_expansion(node)
+        key = (self.heuristic(node), -node.depth) if self.heuristic else (-node.depth,)
+        if self.best is None or key < self.best_key:
+            self.best, self.best_key = node, key
+
+    def actions(self, state):
+        reason = self.limit_reached()
+        if reason:
+            raise SearchLimitReached(reason)
+        return super().actions(state)
+
+    def should_stop(self):
+        """Return True once a limit has been reached."""
+        return self.limit_reached() is not None
+
+    def sub_budget(self):
+        """The keyword arguments of a BudgetedProblem for a sub-search that must
+        stay within what is left of this budget. Charge the nodes it expands back
+        to this problem with charge()."""
+        return {'max_nodes': None if self.max_nodes is None else max(0, self.max_nodes - self.succs),
+                'deadline': self.deadline, 'max_memory': self.max_memory, 'cancel': self.cancel}
+
+    def charge(self, nodes):
+        """Count nodes expanded outside actions (by a sub-search, say) as
+        expanded here, raising SearchLimitReached if that reaches a limit."""
+        self.succs += nodes
+        reason = self.limit_reached()
+        if reason:
+            raise SearchLimitReached(reason)
+
+    def limit_reached(self):
+        """Return the name of the limit reached, or None, calling progress when it is due."""
+        if self.stopped:
+            return self.stopped
+        now = time.monotonic()
+        if self.cancel is not None and self.cancel.cancelled:
+            self.stopped = 'cancelled'
+        elif self.max_nodes is not None and self.succs >= self.max_nodes:
+            self.stopped = 'node_budget'
+        elif self.deadline is not None and now >= self.deadline:
+            self.stopped = 'deadline'
+        elif self.max_memory is not None and self.succs % self.check_every == 0 \
+                and memory_in_use() > self.max_memory:
+            self.stopped = 'memory'
+        if self.progress is not None and now >= self.next_progress:
+            self.next_progress = now + self.progress_interval
+            self.progress(self.progress_stats())
+        return self.stopped
+
+    def progress_stats(self):
+        """The counters so far, as passed to the progress callback."""
+        elapsed = time.perf_counter() - self.start
+        return {'elapsed': elapsed, 'expanded': self.succs, 'generated': self.states,
+                'goal_tests': self.goal_tests, 'nodes_per_second': self.succs / elapsed if elapsed > 0 else 0.0,
+                'max_depth': self.max_depth, 'best': self.best_key}
+
+
+def memory_in_use():
+    """Bytes of memory the process holds now (its resident set), or its peak where that is all there is."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class SearchResult:
+    """What budgeted_search returns: status is 'solved', 'exhausted' (the search ended without a
+    solution), or the limit that stopped it ('node_budget', 'deadline', 'memory' or 'cancelled');
+    node is the solution, or the best node found so far; problem is the BudgetedProblem that ran."""
+
+    def __init__(self, status, node, problem):
+        self.status = status
+        self.node = node
+        self.problem = problem
+
+    @property
+    def solved(self):
+        return self.status == 'solved'
+
+    @property
+    def stats(self):
+        return self.problem.report()
+
+    def __repr__(self):
+        return '<SearchResult {} {}>'.format(self.status, self.node)
+
+
+def budgeted_search(search, problem, max_nodes=None, time_limit=None, max_memory=None, cancel=None,
+                    progress=None, progress_interval=1.0, events=None, **kwargs):
+    """Run search(problem, **kwargs) within the limits of a BudgetedProblem and
+    return a SearchResult instead of running for ever. Running out of memory
+    also ends the search, with status 'memory'. Any search in this module can
+    be budgeted; in parallel_depth_first_tree_search every worker keeps its own
+    node count, and a cancel token only reaches the searching process."""
+    budgeted = BudgetedProblem(problem, max_nodes, time_limit, max_memory, cancel,
+                               progress, progress_interval, events=events)
+    try:
+        node = search(budgeted, **kwargs)
+    except SearchLimitReached as limit:
+        return SearchResult(limit.reason, budgeted.best, budgeted)
+    except MemoryError:
+        return SearchResult('memory', budgeted.best, budgeted)
+    finally:
+        budgeted.close()
+    if node is None:
+        return SearchResult(budgeted.stopped or 'exhausted', budgeted.best, budgeted)
+    return SearchResult('solved', node, budgeted)
+
+
 def compare_searchers(problems, header,
                       searchers=[breadth_first_tree_search,
                                  breadth_first_graph_search,
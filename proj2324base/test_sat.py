@@ -0,0 +1,74 @@
+# Grupo 18:
+# 103902 Luís Pereira
+# 102707 Tomás Correia
+
+"""Checks the CDCL solver in sat.py against brute force. Run with: python -m unittest test_sat"""
+
+import itertools
+import random
+import unittest
+
+from sat import Solver
+
+
+def random_cnf(rng, num_vars, num_clauses):
+    """Clauses of one to three distinct variables, each negated at random."""
+    return [[var if rng.random() < 0.5 else -var for var in rng.sample(range(1, num_vars + 1), rng.randint(1, min(3, num_vars)))]
+            for _ in range(num_clauses)]
+
+
+def satisfies(assignment, clauses):
+    """assignment is indexed by variable, 0 unused."""
+    return all(any(assignment[abs(literal)] == (literal > 0) for literal in clause) for clause in clauses)
+
+
+def models(num_vars, clauses):
+    """Every model of the clauses, by enumerating all the assignments."""
+    return [values for values in ((None,) + bits for bits in itertools.product((False, True), repeat=num_vars))
+            if satisfies(values, clauses)]
+
+
+class SolverTest(unittest.TestCase):
+    def test_agrees_with_brute_force(self):
+        rng = random.Random(18)
+        for _ in range(300):
+            num_vars = rng.randint(1, 8)
+            clauses = random_cnf(rng, num_vars, rng.randint(1, 5 * num_vars))
+            solver = Solver(num_vars)
+            for clause in clauses:
+                solver.add_clause(clause)
+            found = solver.solve()
+            self.assertEqual(found, bool(models(num_vars, clauses)), clauses)
+            if found:
+                self.assertTrue(satisfies(solver.model, clauses), clauses)
+
+    def test_clauses_added_between_calls(self):
+        # blocking every model as it is found, while it is still assigned, must enumerate each one once;
+        # random clauses are mixed in between the calls so the solver also backjumps over unit and false ones
+        rng = random.Random(102707)
+        for _ in range(150):
+            num_vars = rng.randint(1, 7)
+            clauses = random_cnf(rng, num_vars, rng.randint(0, 3 * num_vars))
+            extra = random_cnf(rng, num_vars, rng.randint(0, num_vars))
+            solver = Solver(num_vars)
+            for clause in clauses:
+                solver.add_clause(clause)
+
+            found = set()
+            while solver.solve():
+                model = tuple(solver.value(var) for var in range(1, num_vars + 1))
+                self.assertTrue(satisfies(solver.model, clauses), clauses)
+                self.assertNotIn(model, found, clauses)
+                found.add(model)
+                if extra:
+                    clauses.append(extra.pop())
+                    solver.add_clause(clauses[-1])
+                solver.add_clause([-var if value else var for var, value in enumerate(model, 1)])
+
+            # a model of the final formula is only ever blocked after it was found
+            expected = {values[1:] for values in models(num_vars, clauses)}
+            self.assertEqual(expected, {model for model in found if satisfies((None,) + model, clauses)}, clauses)
+
+
+if __name__ == "__main__":
+    unittest.main()
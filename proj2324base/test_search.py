@@ -0,0 +1,70 @@
+# Grupo 18:
+# 103902 Luís Pereira
+# 102707 Tomás Correia
+
+"""Regression checks for the searches in search.py. Run with: python -m unittest test_search"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+from search import EightPuzzle, astar_search, iterative_deepening_astar_search, memory_bounded_astar_search
+from utils import TranspositionTable
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PARALLEL_LARGE_BOARD = """
+from pipe import Board, PipeMania
+from generator import generate
+from search import parallel_depth_first_tree_search
+instance, _ = generate(40, 40, 5)
+board = Board.from_masks(instance)
+board.presolve()
+goal_node = parallel_depth_first_tree_search(PipeMania(board), workers=4)
+print(goal_node is not None and goal_node.state.layout.locked_count == 40 * 40)
+"""
+
+
+class ParallelDepthFirstTreeSearchTest(unittest.TestCase):
+    def test_process_exits_after_large_board(self):
+        # the nodes left on the task queue of a large board overflow the pipe buffer; the process
+        # used to hang at exit waiting for the queue's feeder thread to flush them
+        run = subprocess.run([sys.executable, "-c", PARALLEL_LARGE_BOARD], cwd=HERE,
+                             capture_output=True, text=True, timeout=120)
+        self.assertEqual(run.returncode, 0, run.stderr)
+        self.assertEqual(run.stdout.strip(), "True")
+
+
+# 8-puzzles scrambled by seeded random walks, with the cost of their optimal solutions
+EIGHT_PUZZLES = [((1, 5, 2, 7, 4, 0, 3, 8, 6), 13), ((1, 7, 2, 4, 0, 3, 8, 5, 6), 12),
+                 ((2, 4, 3, 8, 7, 1, 6, 0, 5), 15), ((6, 1, 3, 2, 5, 7, 0, 4, 8), 18)]
+
+
+class MemoryBoundedAStarTest(unittest.TestCase):
+    def test_astar_cost(self):
+        for initial, cost in EIGHT_PUZZLES:
+            self.assertEqual(astar_search(EightPuzzle(initial)).path_cost, cost)
+
+    def test_iterative_deepening_astar_is_optimal(self):
+        for initial, cost in EIGHT_PUZZLES:
+            for table in (None, TranspositionTable(1 << 10)):
+                goal_node = iterative_deepening_astar_search(EightPuzzle(initial), table=table)
+                self.assertEqual(goal_node.path_cost, cost, (initial, table))
+
+    def test_memory_bounded_astar_is_optimal(self):
+        # cost + 1 nodes only just hold the solution path, so the search has to forget nodes all along
+        for initial, cost in EIGHT_PUZZLES:
+            for max_nodes in (cost + 1, cost + 2, 10000):
+                for table in (None, TranspositionTable(1 << 10)):
+                    goal_node = memory_bounded_astar_search(EightPuzzle(initial), max_nodes=max_nodes, table=table)
+                    self.assertEqual(goal_node.path_cost, cost, (initial, max_nodes, table))
+
+    def test_memory_bounded_astar_without_room_for_a_solution(self):
+        initial, cost = EIGHT_PUZZLES[0]
+        for table in (None, TranspositionTable(1 << 10)):
+            self.assertIsNone(memory_bounded_astar_search(EightPuzzle(initial), max_nodes=cost, table=table))
+
+
+if __name__ == "__main__":
+    unittest.main()
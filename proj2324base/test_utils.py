@@ -0,0 +1,88 @@
+# Grupo 18:
+# 103902 Luís Pereira
+# 102707 Tomás Correia
+
+"""Regression checks for utils.py. Run with: python -m unittest test_utils"""
+
+import random
+import unittest
+
+from utils import PriorityQueue
+
+
+class PriorityQueueTest(unittest.TestCase):
+    def check_against_model(self, order, seed):
+        # the model is a plain list of (priority, insertion number, item), searched in full on every operation
+        rng = random.Random(seed)
+        f = lambda item: item % 5  # many ties, so insertion order matters
+        sign = 1 if order == 'min' else -1
+        queue, model, inserted = PriorityQueue(order, f), [], 0
+        for _ in range(3000):
+            operation = rng.random()
+            item = rng.randrange(12)
+            if operation < 0.4:
+                queue.append(item)
+                model.append((sign * f(item), inserted, item))
+                inserted += 1
+            elif operation < 0.65 and model:
+                first = min(model)
+                model.remove(first)
+                self.assertEqual(queue.pop(), first[2])
+            elif operation < 0.9:
+                entries = [entry for entry in model if entry[2] == item]
+                self.assertEqual(item in queue, bool(entries))
+                if entries:
+                    self.assertEqual(queue[item], min(entries)[0])
+                    del queue[item]
+                    model.remove(min(entries))
+                else:
+                    self.assertRaises(KeyError, queue.__getitem__, item)
+                    self.assertRaises(KeyError, queue.__delitem__, item)
+            else:
+                for item in range(12):
+                    entries = [entry for entry in model if entry[2] == item]
+                    self.assertEqual(item in queue, bool(entries))
+                    if entries:
+                        self.assertEqual(queue[item], min(entries)[0])
+            self.assertEqual(len(queue), len(model))
+
+        while model:
+            first = min(model)
+            model.remove(first)
+            self.assertEqual(queue.pop(), first[2])
+        self.assertEqual(len(queue), 0)
+        self.assertRaises(Exception, queue.pop)
+
+    def test_min_order(self):
+        for seed in range(5):
+            self.check_against_model('min', seed)
+
+    def test_max_order(self):
+        for seed in range(5):
+            self.check_against_model('max', seed)
+
+    def test_many_deletions(self):
+        # enough deleted entries pile up for the heap to be compacted, which must keep every live one
+        rng = random.Random(18)
+        items = list(range(500))
+        rng.shuffle(items)
+        queue = PriorityQueue(f=lambda item: item // 3)
+        queue.extend(items)
+        deleted = set(rng.sample(items, 400))
+        for item in deleted:
+            del queue[item]
+        kept = [item for item in items if item not in deleted]
+        self.assertEqual([queue.pop() for _ in kept], sorted(kept, key=lambda item: (item // 3, items.index(item))))
+
+    def test_deleted_item_pushed_again(self):
+        queue = PriorityQueue(f=lambda item: item[0])
+        queue.extend([(3, 'a'), (1, 'b'), (2, 'c')])
+        del queue[(1, 'b')]
+        self.assertNotIn((1, 'b'), queue)
+        queue.append((1, 'b'))
+        self.assertIn((1, 'b'), queue)
+        self.assertEqual([queue.pop() for _ in range(3)], [(1, 'b'), (2, 'c'), (3, 'a')])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,7 @@ import collections
 import collections.abc
 import functools
 import heapq
+import itertools
 import operator
 import os.path
 import random
@@ -716,7 +717,7 @@ class hashabledict(dict):
 # ______________________________________________________________________________
 # Queues: Stack, FIFOQueue, PriorityQueue
 # Stack and FIFOQueue are implemented as list and collection.deque
-# PriorityQueue is implemented here
+# PriorityQueue and TranspositionTable are implemented here
 
 
 class PriorityQueue:
@@ -724,10 +725,17 @@ class PriorityQueue:
     order) is returned first.
     If order is 'min', the item with minimum f(x) is
     returned first; if order is 'max', then it is the item with maximum f(x).
-    Also supports dict-like lookup."""
+    Items with the same f(x) are returned in the order they were inserted.
+    Also supports dict-like lookup.
+    Every item is indexed by a dict, so membership and lookup take constant
+    time; deleting an item only marks its heap entry as removed, and removed
+    entries are skipped when they reach the top of the heap."""
 
     def __init__(self, order='min', f=lambda x: x):
-        self.heap = []
+        self.heap = []  # [f(x), insertion number, item, live] entries
+        self.entries = {}  # item -> its live heap entries, in insertion order
+        self.size = 0
+        self.counter = itertools.count()
         if order == 'min':
             self.f = f
         elif order == 'max':  # now item with max f(x)
@@ -737,7 +745,10 @@ class PriorityQueue:
 
     def append(self, item):
         """Insert item at its correct position."""
-        heapq.heappush(self.heap, (self.f(item), item))
+        entry = [self.f(item), next(self.counter), item, True]
+        heapq.heappush(self.heap, entry)
+        self.entries.setdefault(item, []).append(entry)
+        self.size += 1
 
     def extend(self, items):
         """Insert each item in items at its correct position."""
@@ -747,34 +758,134 @@ class PriorityQueue:
     def pop(self):
         """Pop and return the item (with min or max f(x) value)
         depending on the order."""
-        if self.heap:
-            return heapq.heappop(self.heap)[1]
-        else:
-            raise Exception('Trying to pop from empty PriorityQueue.')
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            if entry[3]:
+                self.unlink(entry)
+                return entry[2]
+        raise Exception('Trying to pop from empty PriorityQueue.')
+
+    def unlink(self, entry):
+        """Remove a live entry from the index, leaving it dead in the heap."""
+        entry[3] = False
+        item = entry[2]
+        live = self.entries[item]
+        live.remove(entry)
+        if not live:
+            del self.entries[item]
+        self.size -= 1
+
+    def first_entry(self, key):
+        """Return the live entry of key that would be popped first."""
+        try:
+            return min(self.entries[key])
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
 
     def __len__(self):
         """Return current capacity of PriorityQueue."""
-        return len(self.heap)
+        return self.size
 
     def __contains__(self, key):
         """Return True if the key is in PriorityQueue."""
-        return any([item == key for _, item in self.heap])
+        return key in self.entries
 
     def __getitem__(self, key):
         """Returns the first value associated with key in PriorityQueue.
         Raises KeyError if key is not present."""
-        for value, item in self.heap:
-            if item == key:
-                return value
-        raise KeyError(str(key) + " is not in the priority queue")
+        return self.first_entry(key)[0]
 
     def __delitem__(self, key):
         """Delete the first occurrence of key."""
-        try:
-            del self.heap[[item == key for _, item in self.heap].index(True)]
-        except ValueError:
-            raise KeyError(str(key) + " is not in the priority queue")
-        heapq.heapify(self.heap)
+        self.unlink(self.first_entry(key))
+        if len(self.heap) > 2 * self.size + 64:  # drop the dead entries once they outnumber the live ones
+            self.heap = [entry for entry in self.heap if entry[3]]
+            heapq.heapify(self.heap)
+
+
+class TranspositionTable:
+    """A map from state keys to values that holds at most max_entries entries,
+    for a search to recognise the states it has already seen.
+    With policy 'lru' the least recently used entry makes room for a new one.
+    With policy 'depth' every key has a single slot, and a new entry only takes
+    a slot over from a different key when it is at most as deep, so the states
+    nearest the root, which stand for the largest subtrees, are kept longest."""
+
+    def __init__(self, max_entries=1 << 16, policy='lru'):
+        if max_entries < 1:
+            raise ValueError("A transposition table needs room for at least one entry.")
+        if policy == 'lru':
+            self.entries = collections.OrderedDict()
+        elif policy == 'depth':
+            self.slots = [None] * max_entries  # (key, depth, value) or None
+            self.used = 0
+        else:
+            raise ValueError("Policy must be either 'lru' or 'depth'.")
+        self.max_entries = max_entries
+        self.policy = policy
+        self.hits = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the value stored for key, or default if it is not in the table."""
+        if self.policy == 'lru':
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        slot = self.slots[hash(key) % self.max_entries]
+        if slot is None or slot[0] != key:
+            return default
+        self.hits += 1
+        return slot[2]
+
+    def store(self, key, value, depth=0):
+        """Store value for key, found at the given depth. Return False if the 'depth'
+        policy kept a shallower entry of another key instead."""
+        if self.policy == 'lru':
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            elif len(self.entries) >= self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[key] = value
+            return True
+        index = hash(key) % self.max_entries
+        slot = self.slots[index]
+        if slot is None:
+            self.used += 1
+        elif slot[0] != key:
+            if slot[1] < depth:
+                return False
+            self.evictions += 1
+        self.slots[index] = (key, depth, value)
+        return True
+
+    def __contains__(self, key):
+        if self.policy == 'lru':
+            return key in self.entries
+        slot = self.slots[hash(key) % self.max_entries]
+        return slot is not None and slot[0] == key
+
+    def discard(self, key):
+        """Remove the entry of key, if there is one."""
+        if self.policy == 'lru':
+            self.entries.pop(key, None)
+        elif key in self:
+            self.slots[hash(key) % self.max_entries] = None
+            self.used -= 1
+
+    def __len__(self):
+        return len(self.entries) if self.policy == 'lru' else self.used
+
+    def clear(self):
+        """Remove every entry."""
+        if self.policy == 'lru':
+            self.entries.clear()
+        else:
+            self.slots = [None] * self.max_entries
+            self.used = 0
 
 
 # ______________________________________________________________________________